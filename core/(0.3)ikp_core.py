@@ -11,19 +11,29 @@ Provides:
 - execute_action(action, context)
 """
 
-import yaml, re, os, ast
+import yaml, re, os, ast, functools
+from collections import OrderedDict
+
+# Prefer the libyaml-backed C loader/dumper; fall back to pure Python.
+# IKP_PURE_YAML=1 forces the pure-Python classes (their errors carry more context).
+try:
+    if os.environ.get("IKP_PURE_YAML"):
+        raise ImportError
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
 
 # -------------------------
 # YAML helpers
 # -------------------------
 def load_yaml_text(text):
     try:
-        return yaml.safe_load(text)
+        return yaml.load(text, Loader=_Loader)
     except Exception as e:
         raise RuntimeError(f"YAML parse error: {e}")
 
 def dump_yaml(data):
-    return yaml.dump(data, sort_keys=False, allow_unicode=True)
+    return yaml.dump(data, Dumper=_Dumper, sort_keys=False, allow_unicode=True)
 
 # -------------------------
 # Validation
@@ -84,17 +94,16 @@ def _extract_var_value(v):
         except Exception:
             return ""
 
+def _replace_var(vars_map, m):
+    val = _extract_var_value(vars_map.get(m.group(1)))
+    if val is None:
+        return ""
+    return str(val)
+
 def interpolate(text, vars_map):
-    if not isinstance(text, str):
+    if not isinstance(text, str) or "${" not in text:
         return text
-    def repl(m):
-        key = m.group(1)
-        v = vars_map.get(key)
-        val = _extract_var_value(v)
-        if val is None:
-            return ""
-        return str(val)
-    return _VAR_PATTERN.sub(repl, text)
+    return _VAR_PATTERN.sub(functools.partial(_replace_var, vars_map), text)
 
 # -------------------------
 # Path resolver
@@ -138,17 +147,36 @@ def _check_node(node):
     for child in ast.iter_child_nodes(node):
         _check_node(child)
 
+# checked + compiled expressions, most recently used last
+_COND_CACHE = OrderedDict()
+_COND_CACHE_SIZE = 256
+
+def _compile_cond(expr):
+    code = _COND_CACHE.get(expr)
+    if code is not None:
+        _COND_CACHE.move_to_end(expr)
+        return code
+    try:
+        node = ast.parse(expr, mode='eval')
+    except Exception as e:
+        raise ValueError(f"Parse error: {e}")
+    _check_node(node)
+    try:
+        code = compile(node, "<safe_eval>", "eval")
+    except Exception as e:
+        raise ValueError(f"Evaluation error: {e}")
+    _COND_CACHE[expr] = code
+    if len(_COND_CACHE) > _COND_CACHE_SIZE:
+        _COND_CACHE.popitem(last=False)
+    return code
+
 def safe_eval(expr, vars_map):
     if not isinstance(expr, str):
         raise ValueError("Expression must be a string")
     expr = expr.strip()
     if expr == "":
         return False
-    try:
-        node = ast.parse(expr, mode='eval')
-    except Exception as e:
-        raise ValueError(f"Parse error: {e}")
-    _check_node(node)
+    code = _compile_cond(expr)
     safe_locals = {}
     for k, v in (vars_map or {}).items():
         try:
@@ -175,7 +203,6 @@ def safe_eval(expr, vars_map):
         except Exception:
             safe_locals[k] = val
     try:
-        code = compile(node, "<safe_eval>", "eval")
         return eval(code, {"__builtins__": None}, safe_locals)
     except Exception as e:
         raise ValueError(f"Evaluation error: {e}")
@@ -183,93 +210,118 @@ def safe_eval(expr, vars_map):
 # -------------------------
 # Action execution
 # -------------------------
-_LEGACY_SET_RE = re.compile(r'\s*set\(\s*([^,]+)\s*,\s*(.+)\s*\)\s*', re.I)
-_LEGACY_PROGRESS_RE = re.compile(r'\s*progress\(\s*([^,]+)\s*,\s*([0-9\.\-]+)\s*\)\s*', re.I)
-_LEGACY_GOTO_RE = re.compile(r'\s*goto\(\s*(.+)\s*\)\s*', re.I)
+# set(var, value) | progress(var, number) | goto(target), matched in a single pass
+# m.lastgroup names the command that matched, which keys _LEGACY_HANDLERS
+_LEGACY_RE = re.compile(
+    r'\s*(?:'
+    r'(?P<set>set\(\s*(?P<set_var>[^,]+)\s*,\s*(?P<set_value>.+)\s*\))'
+    r'|(?P<progress>progress\(\s*(?P<progress_var>[^,]+)\s*,\s*(?P<progress_value>[0-9\.\-]+)\s*\))'
+    r'|(?P<goto>goto\(\s*(?P<goto_target>.+)\s*\))'
+    r')\s*', re.I)
+
+def _legacy_set(m, context):
+    k = m.group("set_var").strip()
+    v = m.group("set_value").strip().strip('"').strip("'")
+    setter = context.get("set_var")
+    if setter:
+        setter(k, v)
+
+def _legacy_progress(m, context):
+    name = m.group("progress_var").strip()
+    val = float(m.group("progress_value"))
+    setter = context.get("set_progress")
+    if setter:
+        setter(name, val)
+
+def _legacy_goto(m, context):
+    target = m.group("goto_target").strip()
+    sh = context.get("show_scene")
+    if sh:
+        sh(target)
+
+_LEGACY_HANDLERS = {
+    "set": _legacy_set,
+    "progress": _legacy_progress,
+    "goto": _legacy_goto,
+}
 
 def execute_action(action, context):
     if not action:
         return
     if isinstance(action, str):
-        m = _LEGACY_SET_RE.match(action)
-        if m:
-            k = m.group(1).strip()
-            v = m.group(2).strip().strip('"').strip("'")
-            setter = context.get("set_var")
-            if setter:
-                setter(k, v)
-            return
-        m = _LEGACY_PROGRESS_RE.match(action)
+        m = _LEGACY_RE.match(action)
         if m:
-            name = m.group(1).strip()
-            val = float(m.group(2))
-            setter = context.get("set_progress")
-            if setter:
-                setter(name, val)
-            return
-        m = _LEGACY_GOTO_RE.match(action)
-        if m:
-            target = m.group(1).strip()
-            sh = context.get("show_scene")
-            if sh:
-                sh(target)
-            return
+            _LEGACY_HANDLERS[m.lastgroup](m, context)
         return
     if not isinstance(action, dict):
         return
     typ = action.get("type")
-    if typ == "goto":
-        target = action.get("target")
-        if target and context.get("show_scene"):
-            context["show_scene"](target)
-    elif typ == "set":
-        var = action.get("var")
-        val = action.get("value")
-        if isinstance(val, str):
-            get_vars = context.get("get_vars")
-            if get_vars:
-                try:
-                    val = interpolate(val, get_vars())
-                except Exception:
-                    pass
-        setter = context.get("set_var")
-        if setter and var is not None:
-            setter(var, val)
-    elif typ == "progress":
-        target = action.get("target") or action.get("var")
-        val = action.get("value", 0)
-        if isinstance(val, str):
-            get_vars = context.get("get_vars")
-            if get_vars:
-                try:
-                    val = interpolate(val, get_vars())
-                except Exception:
-                    pass
-        setter = context.get("set_progress")
-        if setter and target:
-            try:
-                setter(target, float(val))
-            except Exception:
-                setter(target, val)
-    elif typ == "if":
-        cond = action.get("condition", "")
-        get_vars = context.get("get_vars", lambda: {})
-        vars_map = get_vars()
-        try:
-            cond_interp = interpolate(cond, vars_map)
-        except Exception:
-            cond_interp = cond
-        try:
-            ok = safe_eval(cond_interp, vars_map)
-        except Exception:
-            ok = False
-        branch = action.get("then") if ok else action.get("else")
-        if isinstance(branch, dict):
-            execute_action(branch, context)
-        elif isinstance(branch, list):
-            for a in branch:
-                execute_action(a, context)
+    handler = _ACTION_HANDLERS.get(typ) if isinstance(typ, str) else None
+    if handler:
+        handler(action, context)
     else:
         handler = context.get("handle_action")
         if callable(handler):
             handler(action)
+
+def _do_goto(action, context):
+    target = action.get("target")
+    if target and context.get("show_scene"):
+        context["show_scene"](target)
+
+def _do_set(action, context):
+    var = action.get("var")
+    val = action.get("value")
+    if isinstance(val, str):
+        get_vars = context.get("get_vars")
+        if get_vars:
+            try:
+                val = interpolate(val, get_vars())
+            except Exception:
+                pass
+    setter = context.get("set_var")
+    if setter and var is not None:
+        setter(var, val)
+
+def _do_progress(action, context):
+    target = action.get("target") or action.get("var")
+    val = action.get("value", 0)
+    if isinstance(val, str):
+        get_vars = context.get("get_vars")
+        if get_vars:
+            try:
+                val = interpolate(val, get_vars())
+            except Exception:
+                pass
+    setter = context.get("set_progress")
+    if setter and target:
+        try:
+            setter(target, float(val))
+        except Exception:
+            setter(target, val)
+
+def _do_if(action, context):
+    cond = action.get("condition", "")
+    get_vars = context.get("get_vars", lambda: {})
+    vars_map = get_vars()
+    try:
+        cond_interp = interpolate(cond, vars_map)
+    except Exception:
+        cond_interp = cond
+    try:
+        ok = safe_eval(cond_interp, vars_map)
+    except Exception:
+        ok = False
+    branch = action.get("then") if ok else action.get("else")
+    if isinstance(branch, dict):
+        execute_action(branch, context)
+    elif isinstance(branch, list):
+        for a in branch:
+            execute_action(a, context)
+
+_ACTION_HANDLERS = {
+    "goto": _do_goto,
+    "set": _do_set,
+    "progress": _do_progress,
+    "if": _do_if,
+}
@@ -3,27 +3,135 @@
 ikp_core.py — shared utilities for IKP tools (fixed AST compatibility)
 
 Provides:
-- load_yaml_text / dump_yaml
-- validate_ikp
-- interpolate
+- load_yaml_text / load_yaml_file / dump_yaml / dump_yaml_file
+- validate_ikp / validate_ikp_stream
+- interpolate / read_vars
 - resolve_path (image resolution)
 - safe_eval (AST-based evaluator for simple numeric & comparison expressions)
 - execute_action(action, context)
+- precompile_actions(data) (optional, pre-compiles static `if` conditions)
 """
 
-import yaml, re, os, ast
+import yaml, re, os, sys, ast, json, functools, copy, hashlib, operator, keyword, tempfile
+from collections import OrderedDict, namedtuple
+
+# Prefer the libyaml-backed C loader/dumper; fall back to pure Python.
+# IKP_PURE_YAML=1 forces the pure-Python classes (their errors carry more context).
+try:
+    if os.environ.get("IKP_PURE_YAML"):
+        raise ImportError
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
 
 # -------------------------
 # YAML helpers
 # -------------------------
-def load_yaml_text(text):
+# Parsed documents keyed by a digest of their source text. Callers receive a
+# deep copy, so mutating the returned data never leaks into the cache.
+_YAML_CACHE = OrderedDict()
+_YAML_CACHE_SIZE = 128
+
+def _parse_yaml(text):
     try:
-        return yaml.safe_load(text)
+        return _intern_names(yaml.load(text, Loader=_Loader))
     except Exception as e:
         raise RuntimeError(f"YAML parse error: {e}")
 
-def dump_yaml(data):
-    return yaml.dump(data, sort_keys=False, allow_unicode=True)
+# values compared against fixed names or used as keys (types, targets, var names)
+_INTERNED_FIELDS = ("type", "target", "var")
+
+def _intern_names(data):
+    """Intern scene names and type/target/var strings so dispatch compares by identity."""
+    if not isinstance(data, dict) or not isinstance(data.get("scenes"), dict):
+        return data
+    data["scenes"] = {sys.intern(k) if isinstance(k, str) else k: v for k, v in data["scenes"].items()}
+    if isinstance(data.get("start"), str):
+        data["start"] = sys.intern(data["start"])
+    stack = [data["scenes"]]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for field in _INTERNED_FIELDS:
+                val = node.get(field)
+                if isinstance(val, str):
+                    node[field] = sys.intern(val)
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return data
+
+def load_yaml_text(text):
+    if not isinstance(text, str):
+        return _parse_yaml(text)
+    key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    if key in _YAML_CACHE:
+        _YAML_CACHE.move_to_end(key)
+    else:
+        _YAML_CACHE[key] = _parse_yaml(text)
+        if len(_YAML_CACHE) > _YAML_CACHE_SIZE:
+            _YAML_CACHE.popitem(last=False)
+    return copy.deepcopy(_YAML_CACHE[key])
+
+# Sidecar cache written next to a source file; JSON rather than pickle so a
+# shared .ikp folder can never carry executable payloads.
+_FILE_CACHE_SUFFIX = ".cache.json"
+
+def load_yaml_file(path):
+    """
+    Load an IKP/YAML file, reusing `<path>.cache.json` when it was written for
+    the file's current mtime and size. The sidecar is (re)written after a parse
+    whose result survives a JSON round-trip; other documents are never cached.
+    """
+    st = os.stat(path)
+    stamp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    cache = path + _FILE_CACHE_SUFFIX
+    try:
+        with open(cache, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("source") == stamp:
+            return _intern_names(cached["data"])
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+    with open(path, "r", encoding="utf-8") as f:
+        data = load_yaml_text(f.read())
+    try:
+        if json.loads(json.dumps(data)) == data:
+            tmp = cache + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"source": stamp, "data": data}, f, ensure_ascii=False)
+            os.replace(tmp, cache)
+    except (OSError, TypeError, ValueError):
+        pass
+    return data
+
+def dump_yaml(data, stream=None):
+    # with a stream, libyaml writes incrementally and None is returned
+    return yaml.dump(data, stream, Dumper=_Dumper, sort_keys=False, allow_unicode=True)
+
+def dump_yaml_file(data, path):
+    """
+    Stream data into path as YAML without holding the dump in memory. The dump
+    goes to a temp file beside path that replaces it only once complete, so a
+    failed dump leaves the old file intact.
+    """
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path) or None)
+    try:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except OSError:
+            mask = os.umask(0); os.umask(mask)
+            mode = 0o666 & ~mask
+        os.chmod(tmp, mode)  # mkstemp creates 0600; keep what open("w") would give
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            dump_yaml(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
 
 # -------------------------
 # Validation
@@ -31,37 +139,120 @@ def dump_yaml(data):
 def validate_ikp(data):
     errors = []
     warnings = []
-    if not isinstance(data, dict):
+    # YAML only produces plain dicts/lists, so exact type checks are enough
+    if type(data) is not dict:
         errors.append("Root must be a mapping (YAML dictionary).")
         return errors, warnings
-    if "scenes" not in data or not isinstance(data["scenes"], dict):
+    scenes = data.get("scenes")
+    if type(scenes) is not dict:
         errors.append("`scenes` must be a mapping with at least one scene.")
         return errors, warnings
-    for sname, scene in data["scenes"].items():
-        if not isinstance(scene, dict):
+    for sname, scene in scenes.items():
+        if type(scene) is not dict:
             errors.append(f"Scene '{sname}' must be a mapping/object.")
             continue
         ui = scene.get("ui")
         if ui is None:
             warnings.append(f"Scene '{sname}' has no `ui` list.")
             continue
-        if not isinstance(ui, list):
+        if type(ui) is not list:
             errors.append(f"Scene '{sname}': `ui` must be a list.")
             continue
-        for i, item in enumerate(ui):
-            if not isinstance(item, dict):
-                errors.append(f"Scene '{sname}' ui[{i}] must be a mapping.")
-                continue
-            if "type" not in item:
-                errors.append(f"Scene '{sname}' ui[{i}] missing required field 'type'.")
+        errors.extend(
+            f"Scene '{sname}' ui[{i}] missing required field 'type'." if type(item) is dict
+            else f"Scene '{sname}' ui[{i}] must be a mapping."
+            for i, item in enumerate(ui)
+            if type(item) is not dict or "type" not in item
+        )
     return errors, warnings
 
+# Structural checks straight from parser events, for callers that only need
+# the verdict. Scalars are resolved/constructed exactly as yaml.load would, but
+# nothing below a ui item is kept.
+_RESOLVER = yaml.resolver.Resolver()
+_CONSTRUCTOR = yaml.constructor.SafeConstructor()
+_STR_TAG = "tag:yaml.org,2002:str"
+_SKELETON_DEPTH = 4  # root > scenes > scene > ui > item
+_SKIPPED = object()
+
+class _NeedsFullLoad(Exception):
+    pass
+
+def _event_scalar(ev):
+    if ev.tag is not None or ev.anchor is not None:
+        raise _NeedsFullLoad
+    tag = _RESOLVER.resolve(yaml.ScalarNode, ev.value, ev.implicit)
+    if tag == _STR_TAG:
+        return ev.value
+    construct = _CONSTRUCTOR.yaml_constructors.get(tag)
+    if construct is None:  # merge keys, '=' values
+        raise _NeedsFullLoad
+    return construct(_CONSTRUCTOR, yaml.ScalarNode(tag, ev.value))
+
+def _event_node(events, ev, depth):
+    cls = type(ev)
+    if cls is yaml.ScalarEvent:
+        val = _event_scalar(ev)
+        return val if depth <= _SKELETON_DEPTH else _SKIPPED
+    if cls is yaml.AliasEvent or ev.tag is not None or ev.anchor is not None:
+        raise _NeedsFullLoad
+    keep = depth <= _SKELETON_DEPTH
+    if cls is yaml.SequenceStartEvent:
+        out = []
+        for ev in events:
+            if type(ev) is yaml.SequenceEndEvent:
+                return out if keep else _SKIPPED
+            val = _event_node(events, ev, depth + 1)
+            if keep:
+                out.append(val)
+    out = {}
+    for ev in events:
+        if type(ev) is yaml.MappingEndEvent:
+            return out if keep else _SKIPPED
+        if type(ev) is not yaml.ScalarEvent:
+            raise _NeedsFullLoad
+        key = _event_scalar(ev)
+        val = _event_node(events, next(events), depth + 1)
+        if keep:
+            out[key] = val
+
+def _event_document(events):
+    next(events)  # StreamStart
+    ev = next(events)
+    if type(ev) is yaml.StreamEndEvent:
+        return None
+    data = _event_node(events, next(events), 0)
+    next(events)  # DocumentEnd
+    if type(next(events)) is not yaml.StreamEndEvent:
+        raise _NeedsFullLoad  # let yaml.load report the extra document
+    return data
+
+def validate_ikp_stream(text):
+    """
+    validate_ikp(yaml.load(text)) without constructing the document: the shape
+    is checked from parser events. Anchors/aliases, explicit tags and merge
+    keys fall back to a full load. Raises RuntimeError on invalid YAML.
+    """
+    try:
+        try:
+            data = _event_document(iter(yaml.parse(text, Loader=_Loader)))
+        except (_NeedsFullLoad, RecursionError):
+            data = yaml.load(text, Loader=_Loader)
+    except Exception as e:
+        raise RuntimeError(f"YAML parse error: {e}")
+    return validate_ikp(data)
+
 # -------------------------
 # Interpolation
 # -------------------------
 _VAR_PATTERN = re.compile(r"\$\{([a-zA-Z0-9_]+)\}")
 
+# plain values returned as-is, skipping the callable/.get() probing below
+_PLAIN_TYPES = frozenset({str, int, float, bool, type(None)})
+
 def _extract_var_value(v):
+    if type(v) in _PLAIN_TYPES:
+        return v
     try:
         if callable(v):
             try:
@@ -84,27 +275,117 @@ def _extract_var_value(v):
         except Exception:
             return ""
 
+def _read_call(v):
+    return v()
+
+def _read_get(v):
+    return v.get()
+
+def _read_plain(v):
+    return v
+
+def _read_probe(v):
+    if callable(v):
+        return v()
+    if hasattr(v, "get") and callable(v.get):
+        return v.get()
+    return v
+
+def _var_reader(tp):
+    if any("__call__" in c.__dict__ for c in tp.__mro__):
+        return _read_call
+    if callable(getattr(tp, "get", None)):
+        return _read_get
+    return _read_probe  # may still carry a per-instance get
+
+# value type -> reader, so each widget/variable class is classified once
+_VAR_READERS = dict.fromkeys(_PLAIN_TYPES, _read_plain)
+
+def read_vars(vars_map):
+    """
+    Plain {name: value} snapshot of a tool's variable map (tk Variables,
+    getter callables, raw values). Unreadable values fall back to str(v).
+    """
+    result = {}
+    for k, v in vars_map.items():
+        reader = _VAR_READERS.get(type(v))
+        if reader is None:
+            reader = _VAR_READERS[type(v)] = _var_reader(type(v))
+        try:
+            result[k] = reader(v)
+        except Exception:
+            try:
+                result[k] = str(v)
+            except Exception:
+                result[k] = None
+    return result
+
+@functools.lru_cache(maxsize=2048)
+def _compile_template(text):
+    """Split a template once into (literals, keys); len(literals) == len(keys) + 1."""
+    parts = _VAR_PATTERN.split(text)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+class _VarLookup:
+    """format_map() mapping that resolves ${name} the way interpolate does."""
+    __slots__ = ("vars_map",)
+
+    def __init__(self, vars_map):
+        self.vars_map = vars_map
+
+    def __getitem__(self, key):
+        val = _extract_var_value(self.vars_map.get(key))
+        return "" if val is None else val
+
+@functools.lru_cache(maxsize=2048)
+def _compile_format(text):
+    """Turn a template into a str.format pattern, or None when a key starts with a digit."""
+    lits, keys = _compile_template(text)
+    if any(k[0].isdigit() for k in keys):
+        return None  # "{0}" would be read as a positional field
+    esc = [l.replace("{", "{{").replace("}", "}}") for l in lits]
+    return esc[0] + "".join("{" + k + "}" + l for k, l in zip(keys, esc[1:]))
+
 def interpolate(text, vars_map):
     if not isinstance(text, str):
         return text
-    def repl(m):
-        key = m.group(1)
-        v = (vars_map or {}).get(key)
-        val = _extract_var_value(v)
-        if val is None:
-            return ""
-        return str(val)
-    return _VAR_PATTERN.sub(repl, text)
+    if "${" not in text:
+        return text
+    vars_map = vars_map or {}
+    # a template that is exactly one "${name}" skips the template split
+    if text.startswith("${") and text.endswith("}") and text.count("${") == 1:
+        key = text[2:-1]
+        if key.isascii() and key.replace("_", "").isalnum():
+            val = _extract_var_value(vars_map.get(key))
+            return "" if val is None else str(val)
+    fmt = _compile_format(text)
+    if fmt is not None:
+        # substitution loop runs inside str.format_map
+        return fmt.format_map(_VarLookup(vars_map))
+    lits, keys = _compile_template(text)
+    out = [lits[0]]
+    for key, lit in zip(keys, lits[1:]):
+        val = _extract_var_value(vars_map.get(key))
+        if val is not None:
+            out.append(str(val))
+        out.append(lit)
+    return "".join(out)
 
 # -------------------------
 # Path resolver
 # -------------------------
+# the tools never chdir, so the working directory is read once
+_cwd = functools.lru_cache(maxsize=1)(os.getcwd)
+
 def resolve_path(src, base_path):
     if not src:
         return None
     if os.path.isabs(src):
         return src
-    return os.path.normpath(os.path.join(base_path or os.getcwd(), src))
+    path = os.path.join(base_path or _cwd(), src)
+    if ".." in src:
+        path = os.path.normpath(path)
+    return path
 
 # -------------------------
 # Safe expression evaluator (AST-based)
@@ -130,13 +411,54 @@ if hasattr(ast, "Bytes"):
 if hasattr(ast, "NameConstant"):
     _allowed_node_classes.add(ast.NameConstant)
 
-_ALLOWED_NODES = tuple(_allowed_node_classes)
+_ALLOWED_NODES = frozenset(_allowed_node_classes)
 
-def _check_node(node):
-    if not isinstance(node, _ALLOWED_NODES):
-        raise ValueError(f"Disallowed expression element: {type(node).__name__}")
-    for child in ast.iter_child_nodes(node):
-        _check_node(child)
+def _check_node(root):
+    for node in ast.walk(root):
+        if type(node) not in _ALLOWED_NODES:
+            raise ValueError(f"Disallowed expression element: {type(node).__name__}")
+
+# `name OP number` conditions (e.g. "hp > 0") are compared directly, without ast/eval
+# plain decimal literals only; anything else (e.g. "007") takes the AST path
+_NUMBER = r"-?(?:0|[1-9]\d*)(?:\.\d+)?"
+_SIMPLE_COND = re.compile(r"^([A-Za-z_]\w*)\s*(==|!=|<=|>=|<|>)\s*(" + _NUMBER + r")$")
+# what an interpolated condition such as "${score} >= 50" usually becomes
+_CONST_COND = re.compile(r"^(" + _NUMBER + r")\s*(==|!=|<=|>=|<|>)\s*(" + _NUMBER + r")$")
+_COMPARE_OPS = {
+    "==": operator.eq, "!=": operator.ne, "<=": operator.le,
+    ">=": operator.ge, "<": operator.lt, ">": operator.gt,
+}
+
+def _simple_compare(name, op, num):
+    return lambda safe_locals: op(safe_locals[name], num)
+
+def _num(text):
+    return float(text) if "." in text else int(text)
+
+@functools.lru_cache(maxsize=512)
+def _compile_expr(expr):
+    """
+    Parse, validate and compile a stripped expression once; reused by safe_eval.
+    Returns (code, names) where names are the variables the expression reads;
+    code is either a code object or, for simple comparisons, a callable that
+    takes the coerced locals.
+    """
+    m = _SIMPLE_COND.match(expr)
+    if m and not keyword.iskeyword(m.group(1)):
+        name, op, num = m.groups()
+        return _simple_compare(name, _COMPARE_OPS[op], _num(num)), frozenset((name,))
+    m = _CONST_COND.match(expr)
+    if m:
+        # both sides are literals: fold the comparison now
+        result = _COMPARE_OPS[m.group(2)](_num(m.group(1)), _num(m.group(3)))
+        return (lambda safe_locals: result), frozenset()
+    try:
+        tree = compile(expr, "<safe_eval>", "eval", flags=ast.PyCF_ONLY_AST)
+    except Exception as e:
+        raise ValueError(f"Parse error: {e}")
+    _check_node(tree)
+    names = frozenset(n.id for n in ast.walk(tree) if type(n) is ast.Name)
+    return compile(tree, "<safe_eval>", "eval"), names
 
 def safe_eval(expr, vars_map):
     if not isinstance(expr, str):
@@ -144,38 +466,41 @@ def safe_eval(expr, vars_map):
     expr = expr.strip()
     if expr == "":
         return False
-    try:
-        node = ast.parse(expr, mode='eval')
-    except Exception as e:
-        raise ValueError(f"Parse error: {e}")
-    _check_node(node)
-    safe_locals = {}
-    for k, v in (vars_map or {}).items():
+    code, names = _compile_expr(expr)
+    return _run_compiled(code, names, vars_map)
+
+_BOOL_STRINGS = {"true": True, "false": False}
+
+def _coerce_str(val):
+    """'true'/'false' -> bool, numeric text -> int/float, anything else unchanged."""
+    text = val.strip()
+    b = _BOOL_STRINGS.get(text.lower())
+    if b is not None:
+        return b
+    # only text that can start a number is worth an int()/float() attempt
+    if text and (text[0].isdigit() or text[0] in "+-."):
         try:
-            if callable(v):
+            return float(val) if "." in val else int(val)
+        except ValueError:
+            pass
+    return val
+
+def _run_compiled(code, names, vars_map):
+    vars_map = vars_map or {}
+    safe_locals = {}
+    for k in names:
+        if k not in vars_map:
+            continue
+        val = v = vars_map[k]
+        if type(v) not in _PLAIN_TYPES and callable(v):
+            try:
                 val = v()
-            else:
+            except Exception:
                 val = v
-        except Exception:
-            val = v
-        try:
-            if isinstance(val, str):
-                low = val.strip().lower()
-                if low in ("true", "false"):
-                    safe_locals[k] = low == "true"
-                    continue
-                try:
-                    if '.' in val:
-                        safe_locals[k] = float(val); continue
-                    else:
-                        safe_locals[k] = int(val); continue
-                except Exception:
-                    pass
-            safe_locals[k] = val
-        except Exception:
-            safe_locals[k] = val
+        safe_locals[k] = _coerce_str(val) if isinstance(val, str) else val
     try:
-        code = compile(node, "<safe_eval>", "eval")
+        if callable(code):
+            return code(safe_locals)
         return eval(code, {"__builtins__": None}, safe_locals)
     except Exception as e:
         raise ValueError(f"Evaluation error: {e}")
@@ -183,9 +508,44 @@ def safe_eval(expr, vars_map):
 # -------------------------
 # Action execution
 # -------------------------
-_LEGACY_SET_RE = re.compile(r'\s*set\(\s*([^,]+)\s*,\s*(.+)\s*\)\s*', re.I)
-_LEGACY_PROGRESS_RE = re.compile(r'\s*progress\(\s*([^,]+)\s*,\s*([0-9\.\-]+)\s*\)\s*', re.I)
-_LEGACY_GOTO_RE = re.compile(r'\s*goto\(\s*(.+)\s*\)\s*', re.I)
+def precompile_actions(data):
+    """
+    Optional pass over a loaded IKP document: every `if` action whose condition
+    has no ${...} placeholders gets its compiled expression stored under
+    `_compiled_cond`, so execute_action skips parsing when it fires.
+    The stored code objects are not YAML-serializable; only use this on data
+    that is rendered, not on data that will be passed to dump_yaml.
+    """
+    stack = [(data or {}).get("scenes") if isinstance(data, dict) else None]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            cond = node.get("condition")
+            if (node.get("type") == "if" and isinstance(cond, str) and "${" not in cond
+                    and cond.strip().lower() not in _CONST_CONDS):
+                try:
+                    node["_compiled_cond"] = _compile_expr(cond.strip())
+                except ValueError:
+                    pass
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return data
+
+# set(var, value) | progress(var, number) | goto(target), matched in a single pass
+# m.lastgroup names the command that matched, which keys _LEGACY_HANDLERS
+_LEGACY_RE = re.compile(
+    r'\s*(?:'
+    r'(?P<set>set\(\s*(?P<set_var>[^,]+)\s*,\s*(?P<set_value>.+)\s*\))'
+    r'|(?P<progress>progress\(\s*(?P<progress_var>[^,]+)\s*,\s*(?P<progress_value>[0-9\.\-]+)\s*\))'
+    r'|(?P<goto>goto\(\s*(?P<goto_target>.+)\s*\))'
+    r')\s*', re.I)
+
+# constant conditions resolved without interpolation or evaluation
+_CONST_CONDS = {"true": True, "false": False, "": False, "1": True, "0": False}
+
+# context callbacks, looked up once per top-level execute_action call
+_Ctx = namedtuple("_Ctx", "show_scene set_var set_progress get_vars handle_action")
 
 def execute_action(action, context):
     """
@@ -197,76 +557,126 @@ def execute_action(action, context):
       - get_vars() -> mapping
       - handle_action(action) optional
     """
+    if not action:
+        return
+    ctx = _Ctx(*(context.get(k) for k in _Ctx._fields))
+    if ctx.get_vars:
+        ctx = _with_cached_vars(ctx)
+    _execute(action, ctx)
+
+def _with_cached_vars(ctx):
+    """
+    Read get_vars() at most once per top-level action; nested and sibling actions
+    share the snapshot until a callback (set/progress/goto/custom) may have changed it.
+    """
+    snapshot = []
+    def get_vars():
+        if not snapshot:
+            snapshot.append(ctx.get_vars())
+        return snapshot[0]
+    def invalidating(fn):
+        if not fn:
+            return fn
+        def call(*args):
+            snapshot.clear()
+            return fn(*args)
+        return call
+    return ctx._replace(
+        get_vars=get_vars,
+        show_scene=invalidating(ctx.show_scene),
+        set_var=invalidating(ctx.set_var),
+        set_progress=invalidating(ctx.set_progress),
+        # custom actions can write variables too
+        handle_action=invalidating(ctx.handle_action) if callable(ctx.handle_action) else ctx.handle_action,
+    )
+
+def _execute(action, ctx):
     if not action:
         return
     # legacy string parsing
     if isinstance(action, str):
-        m = _LEGACY_SET_RE.match(action)
+        m = _LEGACY_RE.match(action)
         if m:
-            k = m.group(1).strip()
-            v = m.group(2).strip().strip('"').strip("'")
-            setter = context.get("set_var")
-            if setter:
-                setter(k, v)
-            return
-        m = _LEGACY_PROGRESS_RE.match(action)
-        if m:
-            name = m.group(1).strip()
-            val = float(m.group(2))
-            setter = context.get("set_progress")
-            if setter:
-                setter(name, val)
-            return
-        m = _LEGACY_GOTO_RE.match(action)
-        if m:
-            target = m.group(1).strip()
-            sh = context.get("show_scene")
-            if sh:
-                sh(target)
-            return
+            _LEGACY_HANDLERS[m.lastgroup](m, ctx)
         return
 
     if not isinstance(action, dict):
         return
 
     typ = action.get("type")
-    if typ == "goto":
-        target = action.get("target")
-        if target and context.get("show_scene"):
-            context["show_scene"](target)
-    elif typ == "set":
-        var = action.get("var")
-        val = action.get("value")
-        if isinstance(val, str):
-            get_vars = context.get("get_vars")
-            if get_vars:
-                try:
-                    val = interpolate(val, get_vars())
-                except Exception:
-                    pass
-        setter = context.get("set_var")
-        if setter and var is not None:
-            setter(var, val)
-    elif typ == "progress":
-        target = action.get("target") or action.get("var")
-        val = action.get("value", 0)
-        if isinstance(val, str):
-            get_vars = context.get("get_vars")
-            if get_vars:
-                try:
-                    val = interpolate(val, get_vars())
-                except Exception:
-                    pass
-        setter = context.get("set_progress")
-        if setter and target:
-            try:
-                setter(target, float(val))
-            except Exception:
-                setter(target, val)
-    elif typ == "if":
-        cond = action.get("condition", "")
-        get_vars = context.get("get_vars", lambda: {})
-        vars_map = get_vars()
+    handler = _ACTION_HANDLERS.get(typ) if isinstance(typ, str) else None
+    if handler:
+        handler(action, ctx)
+    elif callable(ctx.handle_action):
+        ctx.handle_action(action)
+
+def _legacy_set(m, ctx):
+    k = m.group("set_var").strip()
+    v = m.group("set_value").strip().strip('"').strip("'")
+    if ctx.set_var:
+        ctx.set_var(k, v)
+
+def _legacy_progress(m, ctx):
+    name = m.group("progress_var").strip()
+    val = float(m.group("progress_value"))
+    if ctx.set_progress:
+        ctx.set_progress(name, val)
+
+def _legacy_goto(m, ctx):
+    target = m.group("goto_target").strip()
+    if ctx.show_scene:
+        ctx.show_scene(target)
+
+_LEGACY_HANDLERS = {
+    "set": _legacy_set,
+    "progress": _legacy_progress,
+    "goto": _legacy_goto,
+}
+
+def _do_goto(action, ctx):
+    target = action.get("target")
+    if target and ctx.show_scene:
+        ctx.show_scene(target)
+
+def _do_set(action, ctx):
+    var = action.get("var")
+    val = action.get("value")
+    if isinstance(val, str) and ctx.get_vars:
+        try:
+            val = interpolate(val, ctx.get_vars())
+        except Exception:
+            pass
+    if ctx.set_var and var is not None:
+        ctx.set_var(var, val)
+
+def _do_progress(action, ctx):
+    target = action.get("target") or action.get("var")
+    val = action.get("value", 0)
+    if isinstance(val, str) and ctx.get_vars:
+        try:
+            val = interpolate(val, ctx.get_vars())
+        except Exception:
+            pass
+    if ctx.set_progress and target:
+        try:
+            ctx.set_progress(target, float(val))
+        except Exception:
+            ctx.set_progress(target, val)
+
+def _do_if(action, ctx):
+    cond = action.get("condition", "")
+    if isinstance(cond, bool):
+        ok = cond
+    elif isinstance(cond, str) and cond.strip().lower() in _CONST_CONDS:
+        ok = _CONST_CONDS[cond.strip().lower()]
+    elif "_compiled_cond" in action:
+        code, names = action["_compiled_cond"]
+        try:
+            ok = _run_compiled(code, names, ctx.get_vars() if ctx.get_vars else {})
+        except Exception:
+            ok = False
+    else:
+        vars_map = ctx.get_vars() if ctx.get_vars else {}
         try:
             cond_interp = interpolate(cond, vars_map)
         except Exception:
@@ -275,13 +685,16 @@ def execute_action(action, context):
             ok = safe_eval(cond_interp, vars_map)
         except Exception:
             ok = False
-        branch = action.get("then") if ok else action.get("else")
-        if isinstance(branch, dict):
-            execute_action(branch, context)
-        elif isinstance(branch, list):
-            for a in branch:
-                execute_action(a, context)
-    else:
-        handler = context.get("handle_action")
-        if callable(handler):
-            handler(action)
+    branch = action.get("then") if ok else action.get("else")
+    if isinstance(branch, dict):
+        _execute(branch, ctx)
+    elif isinstance(branch, list):
+        for a in branch:
+            _execute(a, ctx)
+
+_ACTION_HANDLERS = {
+    "goto": _do_goto,
+    "set": _do_set,
+    "progress": _do_progress,
+    "if": _do_if,
+}
@@ -5,7 +5,7 @@ Editor + live preview for IKP .ikp files
 - Uses ikp_core for shared logic
 """
 
-import sys, os, re, traceback
+import sys, os, traceback, functools
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
@@ -19,6 +19,13 @@ except Exception:
     Image = None
     ImageTk = None
 
+@functools.lru_cache(maxsize=128)
+def _parse_and_validate(text):
+    """Parse + validate editor text once per distinct buffer; the data is shared, don't mutate it."""
+    data = load_yaml_text(text) or {}
+    errs, warns = validate_ikp(data)
+    return data, errs, warns
+
 # ---------------------------
 # IKP Loader (uses core)
 # ---------------------------
@@ -30,6 +37,7 @@ class IKPLoader(ttk.Frame):
         self.frames = {}
         self.curr_scene = None
         self._image_cache = []  # keep references
+        self._resolved_src_cache = {}  # src -> existing path or None
         self.base_path = base_path or os.getcwd()
         self._build()
 
@@ -52,9 +60,23 @@ class IKPLoader(ttk.Frame):
         self.curr_scene = name
         for w in frame.winfo_children():
             w.destroy()
+        self._image_cache.clear()  # only the scene being rendered needs its photos
         self._render_ui(frame, scene.get("ui", []))
         frame.pack(fill="both", expand=True, padx=8, pady=8)
 
+    def _rebuild_scene(self, name, scene):
+        """Swap in a changed scene definition; only the visible scene is re-rendered now."""
+        frame, _ = self.frames[name]
+        self.frames[name] = (frame, scene)
+        self._resolved_src_cache.clear()  # an edit may be about a newly added image
+        if name == self.curr_scene:
+            frame.pack_forget()  # build off-screen, lay out once when packed again
+            for w in frame.winfo_children():
+                w.destroy()
+            self._image_cache.clear()
+            self._render_ui(frame, scene.get("ui", []))
+            frame.pack(fill="both", expand=True, padx=8, pady=8)
+
     # helper to get variable value for interpolation / safe eval
     def _get_vars_map(self):
         return self.vars
@@ -166,8 +188,14 @@ class IKPLoader(ttk.Frame):
             elif t == "image":
                 src = item.get("src")
                 if src:
-                    path = resolve_path(src, self.base_path)
-                    if Image and path and os.path.exists(path):
+                    try:
+                        path = self._resolved_src_cache[src]
+                    except KeyError:
+                        path = resolve_path(src, self.base_path)
+                        if not (path and os.path.exists(path)):
+                            path = None
+                        self._resolved_src_cache[src] = path
+                    if Image and path:
                         try:
                             img = Image.open(path)
                             img.thumbnail((item.get("width", 800), item.get("height", 400)))
@@ -234,7 +262,10 @@ class IKPEditor(tk.Tk):
 
         self.preview = ttk.Frame(right_col); self.preview.pack(fill="both", expand=True)
         self.lint_area = tk.Text(right_col, height=10, font=("Courier", 10), foreground="red"); self.lint_area.pack(fill="x")
-        self.text.bind("<KeyRelease>", lambda e: self.update_preview())
+        self._last_preview = None  # (data, base_path) behind the current preview
+        self._preview_job = None
+        self._loader = None
+        self.text.bind("<KeyRelease>", lambda e: self._schedule_preview())
         self._load_sample()
         self.update_preview()
 
@@ -316,29 +347,62 @@ scenes:
     def show_validation(self):
         content = self.text.get("1.0", "end-1c")
         try:
-            data = load_yaml_text(content) or {}
+            data, errs, warns = _parse_and_validate(content)
         except Exception as e:
             self.lint_area.delete("1.0", "end"); self.lint_area.insert("1.0", f"YAML parse error: {e}"); return
-        errs, warns = validate_ikp(data)
         out = ""
         if errs: out += "ERRORS:\n" + "\n".join(f"- {e}" for e in errs) + "\n"
         if warns: out += "WARNINGS:\n" + "\n".join(f"- {w}" for w in warns) + "\n"
         if not out: out = "No issues found."
         self.lint_area.delete("1.0", "end"); self.lint_area.insert("1.0", out)
 
+    def _schedule_preview(self):
+        # coalesce bursts of keystrokes into a single rebuild
+        if self._preview_job:
+            self.after_cancel(self._preview_job)
+        self._preview_job = self.after(150, self._do_update_preview)
+
     def update_preview(self):
-        for w in self.preview.winfo_children(): w.destroy()
+        if self._preview_job:
+            self.after_cancel(self._preview_job)
+        self._do_update_preview()
+
+    def _update_loader(self, data):
+        """Re-render only the scenes that changed; False when a full rebuild is needed."""
+        if self._loader is None or self._last_preview is None:
+            return False
+        old, base_path = self._last_preview
+        if base_path != self.base_path or old.get("start") != data.get("start") or list(old["scenes"]) != list(data["scenes"]):
+            return False
+        self._loader.ikp = data
+        for name, scene in data["scenes"].items():
+            if scene != old["scenes"][name]:
+                self._loader._rebuild_scene(name, scene)
+        return True
+
+    def _do_update_preview(self):
+        self._preview_job = None
         try:
             content = self.text.get("1.0", "end-1c")
-            data = load_yaml_text(content) or {}
-            errs, warns = validate_ikp(data)
+            data, errs, warns = _parse_and_validate(content)
+            # whitespace/comment-only edits parse to the same data: keep the preview
+            if self._last_preview == (data, self.base_path) and self.preview.winfo_children():
+                return
+            if not errs and self._update_loader(data):
+                self._last_preview = (data, self.base_path)
+                return
+            self._last_preview = self._loader = None
+            for w in self.preview.winfo_children(): w.destroy()
             if errs:
                 ttk.Label(self.preview, text="Validation failed:", foreground="red").pack(anchor="w")
                 for e in errs: ttk.Label(self.preview, text=e, foreground="red").pack(anchor="w")
                 return
-            loader = IKPLoader(self.preview, data, base_path=self.base_path)
-            loader.pack(fill="both", expand=True)
+            self._loader = IKPLoader(self.preview, data, base_path=self.base_path)
+            self._loader.pack(fill="both", expand=True)
+            self._last_preview = (data, self.base_path)
         except Exception as e:
+            self._last_preview = self._loader = None
+            for w in self.preview.winfo_children(): w.destroy()
             ttk.Label(self.preview, text=f"Preview error: {e}", foreground="red").pack(anchor="w")
             traceback.print_exc()
 
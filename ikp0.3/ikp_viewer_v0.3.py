@@ -5,7 +5,7 @@ Lightweight runtime for .ikp files
 - Uses core for YAML, validation, interpolation, action execution
 """
 
-import sys, os, traceback
+import sys, os, argparse, traceback
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
 
@@ -24,6 +24,8 @@ class IKPViewer(tk.Tk):
         self.geometry("900x600")
         self.vars = {}
         self.scenes = {}
+        self._current_frame = None  # the scene frame that is placed
+        self._resolved_src_cache = {}  # src -> existing path or None
         self.images = []  # keep refs
         self.ikp_file = ikp_file
         self.base_path = os.path.dirname(ikp_file) if ikp_file else os.getcwd()
@@ -63,6 +65,7 @@ class IKPViewer(tk.Tk):
 
         self.ikp = data
         self.scenes.clear()
+        self._resolved_src_cache.clear()
         self.base_path = os.path.dirname(path) or os.getcwd()
         self.ikp_file = path
 
@@ -114,16 +117,18 @@ class IKPViewer(tk.Tk):
         execute_action(action, context)
 
     def show_scene(self, name):
-        for f, _ in self.scenes.values():
-            f.pack_forget()
-
         if name not in self.scenes:
             messagebox.showerror("Scene Error", f"Scene '{name}' not found")
             return
 
         frame, scene = self.scenes[name]
         self.render_scene(frame, scene)
-        frame.pack(fill="both", expand=True)
+        if frame is not self._current_frame:
+            # unmap the old frame (so its widgets can't take focus or keys), map the new
+            if self._current_frame is not None:
+                self._current_frame.place_forget()
+            frame.place(x=0, y=0, relwidth=1, relheight=1)
+            self._current_frame = frame
 
     def render_scene(self, frame, scene):
         for w in frame.winfo_children():
@@ -134,132 +139,134 @@ class IKPViewer(tk.Tk):
         root.pack(fill="both", expand=True, padx=10, pady=10)
 
         for item in scene.get("ui", []):
-            typ = item.get("type", "").lower()
-
-            # LABEL
-            if typ == "label":
-                txt = interpolate(item.get("text", ""), self._get_vars_map())
-                ttk.Label(root, text=txt, wraplength=800).pack(anchor="w", pady=4)
-
-            # INPUT
-            elif typ == "input":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                var = tk.StringVar(value=item.get("default", ""))
-                ttk.Entry(root, textvariable=var).pack(fill="x", pady=2)
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # TEXTAREA
-            elif typ == "textarea":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                txt = tk.Text(root, height=item.get("rows", 6))
-                txt.pack(fill="both", pady=4)
-                if "default" in item:
-                    txt.insert("1.0", item["default"])
-                if item.get("var"):
-                    self.vars[item["var"]] = txt
-
-            # BUTTON
-            elif typ == "button":
-                label = interpolate(item.get("text", "Button"), self._get_vars_map())
-                action = item.get("action") or item.get("goto")
-                def act(a=action):
-                    self._execute_action(a)
-                ttk.Button(root, text=label, command=act).pack(pady=4)
-
-            # DROPDOWN
-            elif typ == "dropdown":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                opts = item.get("options", [])
-                var = tk.StringVar(value=item.get("default") or (opts[0] if opts else ""))
-                ttk.Combobox(root, values=opts, textvariable=var).pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # CHECKBOX
-            elif typ == "checkbox":
-                var = tk.BooleanVar(value=item.get("default", False))
-                ttk.Checkbutton(root, text=item.get("label", ""), variable=var).pack(anchor="w")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # RADIOGROUP
-            elif typ == "radiogroup":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                var = tk.StringVar(value=item.get("default", ""))
-                box = ttk.Frame(root); box.pack(anchor="w")
-                for opt in item.get("options", []):
-                    ttk.Radiobutton(box, text=opt, variable=var, value=opt).pack(side="left")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # COLORPICKER
-            elif typ == "colorpicker":
-                var = tk.StringVar(value=item.get("default", "#ffffff"))
-                def pick():
-                    c = colorchooser.askcolor()[1]
-                    if c:
-                        var.set(c)
-                row = ttk.Frame(root); row.pack(anchor="w")
-                ttk.Button(row, text=item.get("label", "Pick"), command=pick).pack(side="left")
-                ttk.Label(row, textvariable=var).pack(side="left", padx=8)
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # SLIDER
-            elif typ == "slider":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                var = tk.DoubleVar(value=item.get("value", 0))
-                ttk.Scale(root, from_=item.get("from", 0), to=item.get("to", 100), variable=var).pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # PROGRESS
-            elif typ == "progress":
-                var = tk.DoubleVar(value=item.get("value", 0))
-                pb = ttk.Progressbar(root, maximum=item.get("max", 100), variable=var)
-                pb.pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            # IMAGE
-            elif typ == "image":
-                src = item.get("src")
-                if src:
-                    path = resolve_path(src, self.base_path)
-                    if Image and path and os.path.exists(path):
-                        try:
-                            img = Image.open(path)
-                            img.thumbnail((600,400))
-                            tkimg = ImageTk.PhotoImage(img)
-                            self.images.append(tkimg)
-                            ttk.Label(root, image=tkimg).pack(pady=4)
-                        except Exception:
-                            ttk.Label(root, text="[Image load failed]").pack()
-                    else:
-                        ttk.Label(root, text=f"[Image missing: {item.get('src')}]").pack()
-                else:
-                    ttk.Label(root, text="[Image missing]").pack()
-
+            render = self._RENDERERS.get(item.get("type", "").lower(), IKPViewer._render_unsupported)
+            render(self, root, item)
+
+    def _render_label(self, root, item):
+        txt = interpolate(item.get("text", ""), self._get_vars_map())
+        ttk.Label(root, text=txt, wraplength=800).pack(anchor="w", pady=4)
+
+    def _render_input(self, root, item):
+        ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
+        var = tk.StringVar(value=item.get("default", ""))
+        ttk.Entry(root, textvariable=var).pack(fill="x", pady=2)
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_textarea(self, root, item):
+        ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
+        txt = tk.Text(root, height=item.get("rows", 6))
+        txt.pack(fill="both", pady=4)
+        if "default" in item:
+            txt.insert("1.0", item["default"])
+        if item.get("var"):
+            self.vars[item["var"]] = txt
+
+    def _render_button(self, root, item):
+        label = interpolate(item.get("text", "Button"), self._get_vars_map())
+        action = item.get("action") or item.get("goto")
+        def act(a=action):
+            self._execute_action(a)
+        ttk.Button(root, text=label, command=act).pack(pady=4)
+
+    def _render_dropdown(self, root, item):
+        ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
+        opts = item.get("options", [])
+        var = tk.StringVar(value=item.get("default") or (opts[0] if opts else ""))
+        ttk.Combobox(root, values=opts, textvariable=var).pack(fill="x")
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_checkbox(self, root, item):
+        var = tk.BooleanVar(value=item.get("default", False))
+        ttk.Checkbutton(root, text=item.get("label", ""), variable=var).pack(anchor="w")
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_radiogroup(self, root, item):
+        ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
+        var = tk.StringVar(value=item.get("default", ""))
+        box = ttk.Frame(root); box.pack(anchor="w")
+        for opt in item.get("options", []):
+            ttk.Radiobutton(box, text=opt, variable=var, value=opt).pack(side="left")
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_colorpicker(self, root, item):
+        var = tk.StringVar(value=item.get("default", "#ffffff"))
+        def pick():
+            c = colorchooser.askcolor()[1]
+            if c:
+                var.set(c)
+        row = ttk.Frame(root); row.pack(anchor="w")
+        ttk.Button(row, text=item.get("label", "Pick"), command=pick).pack(side="left")
+        ttk.Label(row, textvariable=var).pack(side="left", padx=8)
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_slider(self, root, item):
+        ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
+        var = tk.DoubleVar(value=item.get("value", 0))
+        ttk.Scale(root, from_=item.get("from", 0), to=item.get("to", 100), variable=var).pack(fill="x")
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_progress(self, root, item):
+        var = tk.DoubleVar(value=item.get("value", 0))
+        pb = ttk.Progressbar(root, maximum=item.get("max", 100), variable=var)
+        pb.pack(fill="x")
+        if item.get("var"):
+            self.vars[item["var"]] = var
+
+    def _render_image(self, root, item):
+        src = item.get("src")
+        if src:
+            try:
+                path = self._resolved_src_cache[src]
+            except KeyError:
+                path = resolve_path(src, self.base_path)
+                if not (path and os.path.exists(path)):
+                    path = None
+                self._resolved_src_cache[src] = path
+            if Image and path:
+                try:
+                    img = Image.open(path)
+                    img.thumbnail((600,400))
+                    tkimg = ImageTk.PhotoImage(img)
+                    self.images.append(tkimg)
+                    ttk.Label(root, image=tkimg).pack(pady=4)
+                except Exception:
+                    ttk.Label(root, text="[Image load failed]").pack()
             else:
-                ttk.Label(root, text=f"[Unsupported widget: {typ}]").pack()
+                ttk.Label(root, text=f"[Image missing: {item.get('src')}]").pack()
+        else:
+            ttk.Label(root, text="[Image missing]").pack()
+
+    def _render_unsupported(self, root, item):
+        ttk.Label(root, text=f"[Unsupported widget: {item.get('type', '').lower()}]").pack()
+
+    # widget type -> renderer, looked up once per item
+    _RENDERERS = {
+        "label": _render_label,
+        "input": _render_input,
+        "textarea": _render_textarea,
+        "button": _render_button,
+        "dropdown": _render_dropdown,
+        "checkbox": _render_checkbox,
+        "radiogroup": _render_radiogroup,
+        "colorpicker": _render_colorpicker,
+        "slider": _render_slider,
+        "progress": _render_progress,
+        "image": _render_image,
+    }
 
 def main():
-    args = sys.argv[1:]
-    path = None; start_scene = None; do_validate = False
-    i = 0
-    while i < len(args):
-        a = args[i]
-        if a == "--open" and i+1 < len(args):
-            path = args[i+1]; i += 2
-        elif a == "--start" and i+1 < len(args):
-            start_scene = args[i+1]; i += 2
-        elif a == "--validate":
-            do_validate = True; i += 1
-        elif a in ("-h","--help"):
-            print("Usage: python ikp_viewer_v0.4.py --open path. Options: --validate, --start SceneName"); return
-        else:
-            i += 1
+    p = argparse.ArgumentParser(description="Lightweight runtime for .ikp files")
+    p.add_argument("--open", dest="path", metavar="path", help=".ikp file to open")
+    p.add_argument("--start", dest="start_scene", metavar="SceneName", help="scene to show first")
+    p.add_argument("--validate", action="store_true", help="validate the file and exit")
+    ns, _ = p.parse_known_args()  # unknown options are ignored, as before
+    path, start_scene, do_validate = ns.path, ns.start_scene, ns.validate
 
     if path and do_validate:
         try:
@@ -8,9 +8,9 @@ IKP Visual IDE v0.4 (patched to use ikp_core)
 import tkinter as tk
 from tkinter import ttk, filedialog, simpledialog, messagebox
 from tkinter.scrolledtext import ScrolledText
-import yaml, os
+import os
 
-from ikp_core import dump_yaml, validate_ikp
+from ikp_core import dump_yaml, validate_ikp, load_yaml_text
 
 try:
     from PIL import Image, ImageTk
@@ -273,7 +273,7 @@ class IKPVisualIDE(tk.Tk):
         if not path: return
         try:
             with open(path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f)
+                data = load_yaml_text(f.read())
             if not isinstance(data, dict) or "scenes" not in data:
                 messagebox.showerror("Open Error", "Not a valid IKP file."); return
             self.model = {k:v for k,v in data.items() if k != "meta"}
@@ -5,11 +5,12 @@ Editor + live preview for IKP .ikp files
 Uses ikp_core for YAML, validation, interpolation, actions, and path resolution
 """
 
-import sys, os, traceback
+import sys, os, re, traceback, functools
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-from ikp_core import load_yaml_text, dump_yaml, validate_ikp, interpolate, resolve_path, execute_action
+from ikp_core import load_yaml_text, dump_yaml_file, validate_ikp, interpolate, resolve_path, execute_action, precompile_actions, read_vars
 
 # Optional image support
 try:
@@ -18,23 +19,89 @@ except Exception:
     Image = None
     ImageTk = None
 
+# Decoded thumbnails keyed by (path, mtime, width, height), so preview rebuilds
+# don't re-open and re-scale unchanged images.
+_IMG_CACHE = OrderedDict()
+_IMG_CACHE_SIZE = 64
+
+def _load_photo(path, width, height):
+    key = (path, os.path.getmtime(path), width, height)
+    photo = _IMG_CACHE.get(key)
+    if photo is not None:
+        _IMG_CACHE.move_to_end(key)
+        return photo
+    # thumbnail() drafts JPEGs at a reduced scale before decoding
+    with Image.open(path) as img:
+        img.thumbnail((width, height))
+        photo = ImageTk.PhotoImage(img)
+    _IMG_CACHE[key] = photo
+    if len(_IMG_CACHE) > _IMG_CACHE_SIZE:
+        _IMG_CACHE.popitem(last=False)
+    return photo
+
+@functools.lru_cache(maxsize=128)
+def _parse_and_validate(text):
+    """Parse + validate editor text once per distinct buffer; the data is shared, don't mutate it."""
+    data = load_yaml_text(text) or {}
+    errs, warns = validate_ikp(data)
+    if not errs:
+        # done here so equal buffers yield equal data, even after a loader rendered one
+        precompile_actions(data)
+    return data, errs, warns
+
+def _parses(text):
+    """True if the buffer is valid YAML; usually a cache hit left by the preview."""
+    try:
+        _parse_and_validate(text)
+    except Exception:
+        return False
+    return True
+
+_HEADER_KEY = re.compile(r'^(ikp|meta|scenes|start)\s*:')
+_HEADER_LINES = 30
+
+def _quick_header_has_keys(text):
+    """Detect top-level header keys from the first lines, without a YAML parse."""
+    found = dict.fromkeys(("ikp", "meta", "scenes", "start"), False)
+    for line in text.splitlines()[:_HEADER_LINES]:
+        m = _HEADER_KEY.match(line)
+        if m:
+            found[m.group(1)] = True
+            if m.group(1) == "scenes":
+                break
+    return found
+
 # ---------------------------
 # IKP Loader (uses ikp_core)
 # ---------------------------
 class IKPLoader(ttk.Frame):
     def __init__(self, parent, ikp_data, base_path=None):
         super().__init__(parent)
-        self.ikp = ikp_data or {}
+        self.ikp = precompile_actions(ikp_data or {})
         self.vars = {}
         self.frames = {}
         self.curr_scene = None
         self._image_cache = []
+        self._resolved_src_cache = {}  # src -> existing path or None
+        self._label_pools = {}  # scene frame -> {id(item): (item, label)} for static labels
+        self._plans = {}  # id(ui list) -> (ui list, render steps)
+        self._vars_version = 0  # bumped by every _set_var/_set_progress
+        self._vars_cache = None  # read_vars(self.vars) until something writes a var
+        self._last_rendered = None
         self.base_path = base_path or os.getcwd()
+        # built once; show_scene already ignores empty/unknown targets
+        self._action_context = {
+            "show_scene": self.show_scene,
+            "set_var": self._set_var,
+            "set_progress": self._set_progress,
+            "get_vars": self._get_vars_map,
+            "handle_action": None,
+        }
         self._build()
 
     def _build(self):
         for name, scene in (self.ikp.get("scenes") or {}).items():
-            self.frames[name] = (ttk.Frame(self), scene)
+            self.frames[name] = (None, scene)  # frame is created on first show
         start = self.ikp.get("start")
         if start in self.frames:
             self.show_scene(start)
@@ -44,33 +111,68 @@ class IKPLoader(ttk.Frame):
     def show_scene(self, name):
         if name not in self.frames:
             return
+        if name == self.curr_scene and self._last_rendered == self._render_key(name):
+            return  # same scene, same state: what is on screen is already right
         if self.curr_scene:
             self.frames[self.curr_scene][0].pack_forget()
         frame, scene = self.frames[name]
+        if frame is None:
+            frame = ttk.Frame(self)
+            self.frames[name] = (frame, scene)
         self.curr_scene = name
+        pooled = {w for _, w in self._label_pools.setdefault(frame, {}).values()}
         for w in frame.winfo_children():
-            w.destroy()
+            if w in pooled:
+                w.pack_forget()  # packed again, in order, by _render_label
+            else:
+                w.destroy()
+        self._image_cache.clear()  # only the scene being rendered needs its photos
         self._render_ui(frame, scene.get("ui", []))
         frame.pack(fill="both", expand=True, padx=8, pady=8)
+        self._last_rendered = self._render_key(name)
+
+    def _render_key(self, name):
+        # typed input changes the vars map without going through _set_var
+        return name, id(self.frames[name][1]), self._vars_version, self._get_vars_map()
+
+    def _rebuild_scene(self, name, scene):
+        """Swap in a changed scene definition; only the visible scene is re-rendered now."""
+        frame, _ = self.frames[name]
+        self.frames[name] = (frame, scene)
+        self._resolved_src_cache.clear()  # an edit may be about a newly added image
+        self._label_pools.pop(frame, None)
+        self._plans.clear()
+        self._last_rendered = None
+        if name == self.curr_scene:
+            frame.pack_forget()  # build off-screen, lay out once when packed again
+            for w in frame.winfo_children():
+                w.destroy()
+            self._image_cache.clear()
+            self._render_ui(frame, scene.get("ui", []))
+            frame.pack(fill="both", expand=True, padx=8, pady=8)
 
     def _get_vars_map(self):
-        result = {}
-        for k, v in self.vars.items():
-            try:
-                if callable(v):
-                    result[k] = v()
-                elif hasattr(v, "get") and callable(v.get):
-                    result[k] = v.get()
-                else:
-                    result[k] = v
-            except Exception:
-                try:
-                    result[k] = str(v)
-                except Exception:
-                    result[k] = None
-        return result
+        if self._vars_cache is None:
+            self._vars_cache = read_vars(self.vars)
+        return self._vars_cache
+
+    def _mark_vars_dirty(self, *_):
+        self._vars_cache = None
+
+    def _on_text_modified(self, event):
+        event.widget.edit_modified(False)  # re-arm <<Modified>> for the next edit
+        self._vars_cache = None
+
+    def _bind_var(self, name, value):
+        """Register a widget's value; Tk variables report their own writes."""
+        self.vars[name] = value
+        self._vars_cache = None
+        if isinstance(value, tk.Variable):
+            value.trace_add("write", self._mark_vars_dirty)
 
     def _set_var(self, name, value):
+        self._vars_version += 1
+        self._vars_cache = None
         cur = self.vars.get(name)
         if hasattr(cur, "set") and callable(cur.set):
             try:
@@ -85,6 +187,8 @@ class IKPLoader(ttk.Frame):
             self.vars[name] = value
 
     def _set_progress(self, name, value):
+        self._vars_version += 1
+        self._vars_cache = None
         cur = self.vars.get(name)
         if isinstance(cur, ttk.Progressbar):
             try:
@@ -101,110 +205,153 @@ class IKPLoader(ttk.Frame):
         self.vars[name] = value
 
     def _execute_action(self, action):
-        context = {
-            "show_scene": lambda t: self.show_scene(t) if t else None,
-            "set_var": lambda n, v: self._set_var(n, v),
-            "set_progress": lambda n, v: self._set_progress(n, v),
-            "get_vars": lambda: self._get_vars_map(),
-            "handle_action": None,
-        }
-        execute_action(action, context)
+        execute_action(action, self._action_context)
+
+    def _plan(self, ui):
+        """(renderer, item) steps for a ui list, resolved once per list object."""
+        if not ui:
+            return ()
+        entry = self._plans.get(id(ui))
+        if entry is None or entry[0] is not ui:
+            steps = []
+            for item in ui:
+                t = item.get("type", "")
+                render = self._RENDERERS.get(t)  # types are usually lower case already
+                if render is None:
+                    render = self._RENDERERS.get(t.lower(), IKPLoader._render_unsupported)
+                steps.append((render, item))
+            entry = self._plans[id(ui)] = (ui, steps)
+        return entry[1]
+
+    def _interp(self, text):
+        # the vars snapshot is only worth taking for text that has a ${...}
+        if not isinstance(text, str) or "${" not in text:
+            return text
+        return interpolate(text, self._get_vars_map())
 
     def _render_ui(self, parent, ui):
-        for item in ui:
-            t = item.get("type", "").lower()
-
-            if t in ("label", "richtext"):
-                text = interpolate(item.get("text", ""), self._get_vars_map())
-                ttk.Label(parent, text=text, wraplength=800).pack(anchor="w", pady=4)
-
-            elif t == "input":
-                if item.get("label"):
-                    ttk.Label(parent, text=item["label"]).pack(anchor="w")
-                var = tk.StringVar(value=item.get("default", ""))
-                ent = ttk.Entry(parent, textvariable=var)
-                ent.pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif t == "textarea":
-                ttk.Label(parent, text=item.get("label", "")).pack(anchor="w")
-                txt = tk.Text(parent, height=item.get("rows", 5))
-                if "default" in item:
-                    txt.insert("1.0", item.get("default", ""))
-                txt.pack(fill="both")
-                if item.get("var"):
-                    self.vars[item["var"]] = lambda w=txt: w.get("1.0", "end-1c")
-
-            elif t == "button":
-                label = interpolate(item.get("text", "Button"), self._get_vars_map())
-                action = item.get("action") or item.get("goto")
-                def _on_click(a=action):
-                    self._execute_action(a)
-                ttk.Button(parent, text=label, command=_on_click).pack(pady=4)
-
-            elif t == "slider":
-                ttk.Label(parent, text=item.get("label", "")).pack(anchor="w")
-                var = tk.DoubleVar(value=float(item.get("default", 0)))
-                ttk.Scale(parent, from_=item.get("from", 0), to=item.get("to", 100), variable=var).pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif t == "progress":
-                pb = ttk.Progressbar(parent, maximum=item.get("max", 100))
+        for render, item in self._plan(ui):
+            render(self, parent, item)
+
+    def _render_label(self, parent, item):
+        text = item.get("text", "")
+        pool = self._label_pools.get(parent)
+        if pool is None or not isinstance(text, str) or "${" in text:
+            text = self._interp(text)
+            ttk.Label(parent, text=text, wraplength=800).pack(anchor="w", pady=4)
+            return
+        # static top-level label: reuse the widget from the last visit
+        entry = pool.get(id(item))
+        if entry is None or entry[0] is not item:
+            entry = pool[id(item)] = (item, ttk.Label(parent, text=text, wraplength=800))
+        entry[1].pack(anchor="w", pady=4)
+
+    def _render_input(self, parent, item):
+        if item.get("label"):
+            ttk.Label(parent, text=item["label"]).pack(anchor="w")
+        var = tk.StringVar(value=item.get("default", ""))
+        ent = ttk.Entry(parent, textvariable=var)
+        ent.pack(fill="x")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_textarea(self, parent, item):
+        ttk.Label(parent, text=item.get("label", "")).pack(anchor="w")
+        txt = tk.Text(parent, height=item.get("rows", 5))
+        if "default" in item:
+            txt.insert("1.0", item.get("default", ""))
+        txt.pack(fill="both")
+        txt.bind("<<Modified>>", self._on_text_modified)
+        if item.get("var"):
+            self._bind_var(item["var"], lambda w=txt: w.get("1.0", "end-1c"))
+
+    def _render_button(self, parent, item):
+        label = self._interp(item.get("text", "Button"))
+        action = item.get("action") or item.get("goto")
+        def _on_click(a=action):
+            self._execute_action(a)
+        ttk.Button(parent, text=label, command=_on_click).pack(pady=4)
+
+    def _render_slider(self, parent, item):
+        ttk.Label(parent, text=item.get("label", "")).pack(anchor="w")
+        var = tk.DoubleVar(value=float(item.get("default", 0)))
+        ttk.Scale(parent, from_=item.get("from", 0), to=item.get("to", 100), variable=var).pack(fill="x")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_progress(self, parent, item):
+        pb = ttk.Progressbar(parent, maximum=item.get("max", 100))
+        try:
+            pb['value'] = item.get("value", 0)
+        except Exception:
+            pass
+        pb.pack(fill="x")
+        if item.get("var"):
+            self._bind_var(item["var"], pb)
+
+    def _render_image(self, parent, item):
+        src = item.get("src")
+        if src:
+            try:
+                path = self._resolved_src_cache[src]
+            except KeyError:
+                path = resolve_path(src, self.base_path)
+                if not (path and os.path.exists(path)):
+                    path = None
+                self._resolved_src_cache[src] = path
+            if Image and path:
                 try:
-                    pb['value'] = item.get("value", 0)
+                    tkimg = _load_photo(path, item.get("width", 800), item.get("height", 400))
+                    self._image_cache.append(tkimg)
+                    ttk.Label(parent, image=tkimg).pack(pady=4)
                 except Exception:
-                    pass
-                pb.pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = pb
-
-            elif t == "image":
-                src = item.get("src")
-                if src:
-                    path = resolve_path(src, self.base_path)
-                    if Image and path and os.path.exists(path):
-                        try:
-                            img = Image.open(path)
-                            img.thumbnail((item.get("width", 800), item.get("height", 400)))
-                            tkimg = ImageTk.PhotoImage(img)
-                            self._image_cache.append(tkimg)
-                            ttk.Label(parent, image=tkimg).pack(pady=4)
-                        except Exception:
-                            ttk.Label(parent, text="[Image load failed]").pack()
-                    else:
-                        ttk.Label(parent, text=f"[image missing: {item.get('src')}]").pack()
-                else:
-                    ttk.Label(parent, text="[image missing]").pack()
-
-            elif t == "tabs":
-                nb = ttk.Notebook(parent)
-                nb.pack(fill="both", expand=True)
-                for tab in item.get("tabs", []):
-                    f = ttk.Frame(nb)
-                    nb.add(f, text=tab.get("label", "Tab"))
-                    self._render_ui(f, tab.get("ui", []))
-
-            elif t == "accordion":
-                for sec in item.get("sections", []):
-                    head = ttk.Frame(parent)
-                    head.pack(fill="x")
-                    body = ttk.Frame(parent)
-                    body.pack_forget()
-                    ttk.Label(head, text=sec.get("title", "Section")).pack(side="left")
-                    btn = ttk.Button(head, text="+")
-                    btn.pack(side="right")
-                    def toggle(b=btn, c=body):
-                        if c.winfo_ismapped():
-                            c.pack_forget(); b.config(text="+")
-                        else:
-                            c.pack(fill="x"); b.config(text="-")
-                    btn.config(command=toggle)
-                    self._render_ui(body, sec.get("ui", []))
-
+                    ttk.Label(parent, text="[Image load failed]").pack()
             else:
-                ttk.Label(parent, text=f"[Unsupported: {t}]").pack()
+                ttk.Label(parent, text=f"[image missing: {item.get('src')}]").pack()
+        else:
+            ttk.Label(parent, text="[image missing]").pack()
+
+    def _render_tabs(self, parent, item):
+        nb = ttk.Notebook(parent)
+        nb.pack(fill="both", expand=True)
+        for tab in item.get("tabs", []):
+            f = ttk.Frame(nb)
+            nb.add(f, text=tab.get("label", "Tab"))
+            self._render_ui(f, tab.get("ui", []))
+
+    def _render_accordion(self, parent, item):
+        for sec in item.get("sections", []):
+            head = ttk.Frame(parent)
+            head.pack(fill="x")
+            body = ttk.Frame(parent)
+            body.pack_forget()
+            ttk.Label(head, text=sec.get("title", "Section")).pack(side="left")
+            btn = ttk.Button(head, text="+")
+            btn.pack(side="right")
+            def toggle(b=btn, c=body):
+                if c.winfo_ismapped():
+                    c.pack_forget(); b.config(text="+")
+                else:
+                    c.pack(fill="x"); b.config(text="-")
+            btn.config(command=toggle)
+            self._render_ui(body, sec.get("ui", []))
+
+    def _render_unsupported(self, parent, item):
+        ttk.Label(parent, text=f"[Unsupported: {item.get('type', '').lower()}]").pack()
+
+    # widget type -> renderer, looked up once per item
+    _RENDERERS = {
+        "label": _render_label,
+        "richtext": _render_label,
+        "input": _render_input,
+        "textarea": _render_textarea,
+        "button": _render_button,
+        "slider": _render_slider,
+        "progress": _render_progress,
+        "image": _render_image,
+        "tabs": _render_tabs,
+        "accordion": _render_accordion,
+    }
 
 # ---------------------------
 # Editor app
@@ -228,7 +375,11 @@ class IKPEditor(tk.Tk):
 
         self.preview = ttk.Frame(right_col); self.preview.pack(fill="both", expand=True)
         self.lint_area = tk.Text(right_col, height=10, font=("Courier", 10), foreground="red"); self.lint_area.pack(fill="x")
-        self.text.bind("<KeyRelease>", lambda e: self.update_preview())
+        self._preview_job = None
+        self._loader = None
+        self._last_data = None
+        self._last_source = None  # (text, base_path) currently shown
+        self.text.bind("<KeyRelease>", lambda e: self._schedule_preview())
         self._load_sample()
         self.update_preview()
 
@@ -282,6 +433,13 @@ scenes:
             return self.save_file_as()
         try:
             content = self.text.get("1.0", "end-1c")
+            header = _quick_header_has_keys(content)
+            if header["ikp"] and header["meta"] and _parses(content):
+                # nothing to inject, keep the buffer as typed
+                with open(self.file_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+                messagebox.showinfo("Saved", f"Saved to {self.file_path}")
+                return
             try:
                 data = load_yaml_text(content) or {}
             except Exception as e:
@@ -294,9 +452,7 @@ scenes:
                 data["ikp"] = "0.4"
             if "meta" not in data:
                 data["meta"] = {"title": "Untitled"}
-            final = dump_yaml(data)
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                f.write(final)
+            dump_yaml_file(data, self.file_path)
             messagebox.showinfo("Saved", f"Saved to {self.file_path}")
         except Exception as e:
             messagebox.showerror("Save Error", str(e))
@@ -310,29 +466,71 @@ scenes:
     def show_validation(self):
         content = self.text.get("1.0", "end-1c")
         try:
-            data = load_yaml_text(content) or {}
+            data, errs, warns = _parse_and_validate(content)
         except Exception as e:
             self.lint_area.delete("1.0", "end"); self.lint_area.insert("1.0", f"YAML parse error: {e}"); return
-        errs, warns = validate_ikp(data)
         out = ""
         if errs: out += "ERRORS:\n" + "\n".join(f"- {e}" for e in errs) + "\n"
         if warns: out += "WARNINGS:\n" + "\n".join(f"- {w}" for w in warns) + "\n"
         if not out: out = "No issues found."
         self.lint_area.delete("1.0", "end"); self.lint_area.insert("1.0", out)
 
+    def _schedule_preview(self):
+        # coalesce bursts of keystrokes into a single rebuild
+        if self._preview_job:
+            self.after_cancel(self._preview_job)
+        self._preview_job = self.after(150, self._do_update_preview)
+
     def update_preview(self):
+        if self._preview_job:
+            self.after_cancel(self._preview_job)
+        self._do_update_preview()
+
+    def _clear_preview(self):
         for w in self.preview.winfo_children(): w.destroy()
+        self._loader = None
+        self._last_data = None
+        self._last_source = None
+
+    def _update_loader(self, data):
+        """Re-render only the scenes that changed; False when a full rebuild is needed."""
+        loader = self._loader
+        if loader is None or loader.base_path != self.base_path:
+            return False
+        old, new = self._last_data, data
+        if old.get("start") != new.get("start") or list(old["scenes"]) != list(new["scenes"]):
+            return False
+        loader.ikp = data
+        for name, scene in new["scenes"].items():
+            if scene != old["scenes"][name]:
+                loader._rebuild_scene(name, scene)
+        return True
+
+    def _do_update_preview(self):
+        self._preview_job = None
         try:
             content = self.text.get("1.0", "end-1c")
-            data = load_yaml_text(content) or {}
-            errs, warns = validate_ikp(data)
+            source = (content, self.base_path)
+            if source == self._last_source:
+                return  # cursor moves, selections, modifier keys
+            data, errs, warns = _parse_and_validate(content)
             if errs:
+                self._clear_preview()
                 ttk.Label(self.preview, text="Validation failed:", foreground="red").pack(anchor="w")
                 for e in errs: ttk.Label(self.preview, text=e, foreground="red").pack(anchor="w")
+                self._last_source = source
+                return
+            if self._loader is not None and self._loader.base_path == self.base_path and data == self._last_data:
+                self._last_source = source  # whitespace/comment edit: same preview
                 return
-            loader = IKPLoader(self.preview, data, base_path=self.base_path)
-            loader.pack(fill="both", expand=True)
+            if not self._update_loader(data):
+                self._clear_preview()
+                self._loader = IKPLoader(self.preview, data, base_path=self.base_path)
+                self._loader.pack(fill="both", expand=True)
+            self._last_data = data
+            self._last_source = source
         except Exception as e:
+            self._clear_preview()
             ttk.Label(self.preview, text=f"Preview error: {e}", foreground="red").pack(anchor="w")
             traceback.print_exc()
 
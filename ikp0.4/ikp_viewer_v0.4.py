@@ -5,11 +5,13 @@ Lightweight runtime for .ikp files
 Uses ikp_core for YAML, validation, interpolation, action execution
 """
 
-import sys, os
+import sys, os, argparse, tempfile, queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
 
-from ikp_core import load_yaml_text, validate_ikp, interpolate, resolve_path, execute_action
+from ikp_core import load_yaml_file, validate_ikp, validate_ikp_stream, interpolate, resolve_path, execute_action, precompile_actions, read_vars
 
 try:
     from PIL import Image, ImageTk
@@ -17,6 +19,84 @@ except Exception:
     Image = None
     ImageTk = None
 
+# Decoded thumbnails keyed by (path, mtime, width, height), so revisiting a
+# scene doesn't re-open and re-scale its images.
+_IMG_CACHE = OrderedDict()
+_IMG_CACHE_SIZE = 64
+
+# Spare widgets kept per (parent, class); Tk widgets can't change parent,
+# so each scene's inner frame has its own pool.
+_POOL_SIZE = 64
+_POOLED = (ttk.Label, ttk.Entry, ttk.Button)
+# options cleared when a widget goes back to its pool, so a spare doesn't keep
+# the last scene's variable or callback alive
+_POOL_RESET = {
+    ttk.Label: {"textvariable": ""},
+    ttk.Entry: {"textvariable": ""},
+    ttk.Button: {"command": ""},
+}
+
+# Downscaled copies are also kept on disk beside the source, so a later run
+# decodes a small PNG instead of resampling the original again.
+_THUMB_SUFFIX = ".thumb_{}x{}.png"
+
+def _photo_key(path, width, height):
+    return path, os.path.getmtime(path), width, height
+
+def _cached_photo(key):
+    photo = _IMG_CACHE.get(key)
+    if photo is not None:
+        _IMG_CACHE.move_to_end(key)
+    return photo
+
+def _store_photo(key, photo):
+    _IMG_CACHE[key] = photo
+    if len(_IMG_CACHE) > _IMG_CACHE_SIZE:
+        _IMG_CACHE.popitem(last=False)
+    return photo
+
+def _decode_thumbnail(path, width, height):
+    """PIL-only half of loading an image, safe to run off the Tk thread."""
+    thumb = path + _THUMB_SUFFIX.format(width, height)
+    try:
+        fresh = os.path.getmtime(thumb) >= os.path.getmtime(path)
+    except OSError:
+        fresh = False
+    if fresh:
+        try:
+            with Image.open(thumb) as img:
+                return img.copy()
+        except Exception:
+            # PIL reports a corrupt PNG as SyntaxError/ValueError, not just OSError
+            try:
+                os.remove(thumb)
+            except OSError:
+                pass
+    # thumbnail() drafts JPEGs at a reduced scale before decoding
+    with Image.open(path) as img:
+        full = img.size
+        img.thumbnail((width, height))
+        if img.size != full:
+            _save_thumb(img, thumb)
+        return img.copy()
+
+def _save_thumb(img, thumb):
+    # a private tmp name, so concurrent writers never share a half-written file
+    try:
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(thumb) or None)
+    except OSError:
+        return  # read-only folder: just don't cache
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, "PNG")
+        os.replace(tmp, thumb)
+    except (OSError, ValueError):
+        # a mode PNG can't hold: just don't cache
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
 class IKPViewer(tk.Tk):
     def __init__(self, ikp_file=None, start_scene=None):
         super().__init__()
@@ -24,7 +104,27 @@ class IKPViewer(tk.Tk):
         self.geometry("900x600")
         self.vars = {}
         self.scenes = {}
+        self._plans = {}  # id(ui list) -> (ui list, render steps)
+        self._resolved_src_cache = {}  # src -> existing path or None
+        self._vars_version = 0  # bumped by every _set_var/_set_progress
+        self._vars_cache = None  # read_vars(self.vars) until something writes a var
+        self._last_rendered = None
+        self._current_frame = None  # the scene frame that is placed
+        self._roots = {}  # scene frame -> persistent inner frame
+        self._widget_pool = {}  # (parent, widget class) -> spare widgets
+        self._pooled = {}  # live pooled widget -> its pool key
         self.images = []
+        self._img_pool = ThreadPoolExecutor(max_workers=2)  # thumbnail decodes
+        self._img_futures = {}  # photo key -> decode not yet stored in the LRU
+        self._img_done = queue.SimpleQueue()  # (key, future) from worker done-callbacks
+        # built once per viewer rather than per click
+        self._action_context = {
+            "show_scene": self._goto,
+            "set_var": self._set_var,
+            "set_progress": self._set_progress,
+            "get_vars": self._get_vars_map,
+            "handle_action": None,
+        }
         self.ikp_file = ikp_file
         self.base_path = os.path.dirname(ikp_file) if ikp_file else os.getcwd()
 
@@ -45,8 +145,7 @@ class IKPViewer(tk.Tk):
 
     def load_file(self, path, start_scene=None):
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = load_yaml_text(f.read())
+            data = load_yaml_file(path)
         except Exception as e:
             messagebox.showerror("IKP Error", str(e))
             self.destroy(); return
@@ -61,36 +160,49 @@ class IKPViewer(tk.Tk):
             messagebox.showerror("IKP Error", "No scenes found.")
             self.destroy(); return
 
-        self.ikp = data
+        self.ikp = precompile_actions(data)
+        for frame, _ in self.scenes.values():
+            if frame is not None:
+                frame.destroy()
+        self._current_frame = None
         self.scenes.clear()
+        self._plans.clear()
+        self._resolved_src_cache.clear()
+        self._roots.clear()
+        self._widget_pool.clear()
+        self._pooled.clear()
+        self._last_rendered = None
         self.base_path = os.path.dirname(path) or os.getcwd()
         self.ikp_file = path
 
         for name, scene in scenes.items():
-            frame = ttk.Frame(self)
-            self.scenes[name] = (frame, scene)
+            self.scenes[name] = (None, scene)  # frame is created on first show
 
         start = start_scene or data.get("start") or next(iter(scenes))
         self.show_scene(start)
 
     def _get_vars_map(self):
-        result = {}
-        for k, v in self.vars.items():
-            try:
-                if callable(v):
-                    result[k] = v()
-                elif hasattr(v, "get") and callable(v.get):
-                    result[k] = v.get()
-                else:
-                    result[k] = v
-            except Exception:
-                try:
-                    result[k] = str(v)
-                except Exception:
-                    result[k] = None
-        return result
+        if self._vars_cache is None:
+            self._vars_cache = read_vars(self.vars)
+        return self._vars_cache
+
+    def _mark_vars_dirty(self, *_):
+        self._vars_cache = None
+
+    def _on_text_modified(self, event):
+        event.widget.edit_modified(False)  # re-arm <<Modified>> for the next edit
+        self._vars_cache = None
+
+    def _bind_var(self, name, value):
+        """Register a widget's value; Tk variables report their own writes."""
+        self.vars[name] = value
+        self._vars_cache = None
+        if isinstance(value, tk.Variable):
+            value.trace_add("write", self._mark_vars_dirty)
 
     def _set_var(self, name, value):
+        self._vars_version += 1
+        self._vars_cache = None
         cur = self.vars.get(name)
         if hasattr(cur, "set") and callable(cur.set):
             try:
@@ -104,6 +216,8 @@ class IKPViewer(tk.Tk):
             self.vars[name] = value
 
     def _set_progress(self, name, value):
+        self._vars_version += 1
+        self._vars_cache = None
         cur = self.vars.get(name)
         if isinstance(cur, ttk.Progressbar):
             try:
@@ -118,157 +232,270 @@ class IKPViewer(tk.Tk):
         self.vars[name] = value
 
     def _execute_action(self, action):
-        context = {
-            "show_scene": lambda t: self.show_scene(t) if t else None,
-            "set_var": lambda n, v: self._set_var(n, v),
-            "set_progress": lambda n, v: self._set_progress(n, v),
-            "get_vars": lambda: self._get_vars_map(),
-            "handle_action": None,
-        }
-        execute_action(action, context)
+        execute_action(action, self._action_context)
+
+    def _goto(self, target):
+        # an empty goto target is a no-op, not a "scene not found" error
+        if target:
+            self.show_scene(target)
 
     def show_scene(self, name):
-        for f, _ in self.scenes.values():
-            f.pack_forget()
+        if name in self.scenes and self._last_rendered == self._render_key(name):
+            return  # same scene, same state: what is on screen is already right
+        self._last_rendered = None
 
         if name not in self.scenes:
             messagebox.showerror("Scene Error", f"Scene '{name}' not found")
             return
 
         frame, scene = self.scenes[name]
+        if frame is None:
+            frame = ttk.Frame(self)
+            self.scenes[name] = (frame, scene)
         self.render_scene(frame, scene)
-        frame.pack(fill="both", expand=True)
+        if frame is not self._current_frame:
+            # unmap the old frame (so its widgets can't take focus or keys), map the new
+            if self._current_frame is not None:
+                self._current_frame.place_forget()
+            frame.place(x=0, y=0, relwidth=1, relheight=1)
+            self._current_frame = frame
+        self._last_rendered = self._render_key(name)
+
+    def _render_key(self, name):
+        # typed input changes the vars map without going through _set_var
+        return name, id(self.scenes[name][1]), self._vars_version, self._get_vars_map()
 
     def render_scene(self, frame, scene):
-        for w in frame.winfo_children():
-            w.destroy()
+        root = self._roots.get(frame)
+        if root is None:
+            for w in frame.winfo_children():
+                w.destroy()
+            root = self._roots[frame] = ttk.Frame(frame)
+            root.pack(fill="both", expand=True, padx=10, pady=10)
+        else:
+            self._release(root)
         self.images.clear()
 
-        root = ttk.Frame(frame)
-        root.pack(fill="both", expand=True, padx=10, pady=10)
-
-        for item in scene.get("ui", []):
-            typ = item.get("type", "").lower()
-
-            if typ == "label":
-                txt = interpolate(item.get("text", ""), self._get_vars_map())
-                ttk.Label(root, text=txt, wraplength=800).pack(anchor="w", pady=4)
-
-            elif typ == "input":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                var = tk.StringVar(value=item.get("default", ""))
-                ttk.Entry(root, textvariable=var).pack(fill="x", pady=2)
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "textarea":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                txt = tk.Text(root, height=item.get("rows", 6))
-                txt.pack(fill="both", pady=4)
-                if "default" in item:
-                    txt.insert("1.0", item["default"])
-                if item.get("var"):
-                    self.vars[item["var"]] = txt
-
-            elif typ == "button":
-                label = interpolate(item.get("text", "Button"), self._get_vars_map())
-                action = item.get("action") or item.get("goto")
-                def act(a=action):
-                    self._execute_action(a)
-                ttk.Button(root, text=label, command=act).pack(pady=4)
-
-            elif typ == "dropdown":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                opts = item.get("options", [])
-                var = tk.StringVar(value=item.get("default") or (opts[0] if opts else ""))
-                ttk.Combobox(root, values=opts, textvariable=var).pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "checkbox":
-                var = tk.BooleanVar(value=item.get("default", False))
-                ttk.Checkbutton(root, text=item.get("label", ""), variable=var).pack(anchor="w")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "radiogroup":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                var = tk.StringVar(value=item.get("default", ""))
-                box = ttk.Frame(root); box.pack(anchor="w")
-                for opt in item.get("options", []):
-                    ttk.Radiobutton(box, text=opt, variable=var, value=opt).pack(side="left")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "colorpicker":
-                var = tk.StringVar(value=item.get("default", "#ffffff"))
-                def pick():
-                    c = colorchooser.askcolor()[1]
-                    if c:
-                        var.set(c)
-                row = ttk.Frame(root); row.pack(anchor="w")
-                ttk.Button(row, text=item.get("label", "Pick"), command=pick).pack(side="left")
-                ttk.Label(row, textvariable=var).pack(side="left", padx=8)
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "slider":
-                ttk.Label(root, text=item.get("label", "")).pack(anchor="w")
-                var = tk.DoubleVar(value=item.get("value", 0))
-                ttk.Scale(root, from_=item.get("from", 0), to=item.get("to", 100), variable=var).pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "progress":
-                var = tk.DoubleVar(value=item.get("value", 0))
-                pb = ttk.Progressbar(root, maximum=item.get("max", 100), variable=var)
-                pb.pack(fill="x")
-                if item.get("var"):
-                    self.vars[item["var"]] = var
-
-            elif typ == "image":
-                src = item.get("src")
-                if src:
-                    path = resolve_path(src, self.base_path)
-                    if Image and path and os.path.exists(path):
-                        try:
-                            img = Image.open(path)
-                            img.thumbnail((600,400))
-                            tkimg = ImageTk.PhotoImage(img)
-                            self.images.append(tkimg)
-                            ttk.Label(root, image=tkimg).pack(pady=4)
-                        except Exception:
-                            ttk.Label(root, text="[Image load failed]").pack()
+        for render, item in self._plan(scene.get("ui", [])):
+            render(self, root, item)
+
+    def _acquire(self, cls, root, **opts):
+        """A spare `cls` widget under root reconfigured with opts, or a new one."""
+        free = self._widget_pool.get((root, cls))
+        if free:
+            w = free.pop()
+            w.configure(**opts)
+            w.lift()  # Tab order follows stacking order, i.e. this render's order
+            return w
+        w = cls(root, **opts)
+        self._pooled[w] = (root, cls)
+        return w
+
+    def _release(self, root):
+        """Unpack root's pooled children back into its pools; destroy the rest."""
+        for cls in _POOLED:
+            self._widget_pool.pop((root, cls), None)
+        for w in root.winfo_children():
+            key = self._pooled.get(w)
+            free = self._widget_pool.setdefault(key, []) if key else None
+            if free is not None and len(free) < _POOL_SIZE:
+                w.pack_forget()
+                w.configure(**_POOL_RESET[key[1]])
+                free.append(w)
+            else:
+                self._pooled.pop(w, None)
+                w.destroy()
+
+    def _plan(self, ui):
+        """(renderer, item) steps for a scene's ui list, resolved once per list object."""
+        if not ui:
+            return ()
+        entry = self._plans.get(id(ui))
+        if entry is None or entry[0] is not ui:
+            steps = [(self._RENDERERS.get(item.get("type", "").lower(), IKPViewer._render_unsupported), item)
+                     for item in ui]
+            entry = self._plans[id(ui)] = (ui, steps)
+        return entry[1]
+
+    def _interp(self, text):
+        # the vars snapshot is only worth taking for text that has a ${...}
+        if not isinstance(text, str) or "${" not in text:
+            return text
+        return interpolate(text, self._get_vars_map())
+
+    def _render_label(self, root, item):
+        txt = self._interp(item.get("text", ""))
+        self._acquire(ttk.Label, root, text=txt, wraplength=800).pack(anchor="w", pady=4)
+
+    def _render_input(self, root, item):
+        self._acquire(ttk.Label, root, text=item.get("label", ""), wraplength=0).pack(anchor="w")
+        var = tk.StringVar(value=item.get("default", ""))
+        self._acquire(ttk.Entry, root, textvariable=var).pack(fill="x", pady=2)
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_textarea(self, root, item):
+        self._acquire(ttk.Label, root, text=item.get("label", ""), wraplength=0).pack(anchor="w")
+        txt = tk.Text(root, height=item.get("rows", 6))
+        txt.pack(fill="both", pady=4)
+        if "default" in item:
+            txt.insert("1.0", item["default"])
+        txt.bind("<<Modified>>", self._on_text_modified)
+        if item.get("var"):
+            self._bind_var(item["var"], txt)
+
+    def _render_button(self, root, item):
+        label = self._interp(item.get("text", "Button"))
+        action = item.get("action") or item.get("goto")
+        def act(a=action):
+            self._execute_action(a)
+        self._acquire(ttk.Button, root, text=label, command=act).pack(pady=4)
+
+    def _render_dropdown(self, root, item):
+        self._acquire(ttk.Label, root, text=item.get("label", ""), wraplength=0).pack(anchor="w")
+        opts = item.get("options", [])
+        var = tk.StringVar(value=item.get("default") or (opts[0] if opts else ""))
+        ttk.Combobox(root, values=opts, textvariable=var).pack(fill="x")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_checkbox(self, root, item):
+        var = tk.BooleanVar(value=item.get("default", False))
+        ttk.Checkbutton(root, text=item.get("label", ""), variable=var).pack(anchor="w")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_radiogroup(self, root, item):
+        self._acquire(ttk.Label, root, text=item.get("label", ""), wraplength=0).pack(anchor="w")
+        var = tk.StringVar(value=item.get("default", ""))
+        box = ttk.Frame(root); box.pack(anchor="w")
+        for opt in item.get("options", []):
+            ttk.Radiobutton(box, text=opt, variable=var, value=opt).pack(side="left")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_colorpicker(self, root, item):
+        var = tk.StringVar(value=item.get("default", "#ffffff"))
+        def pick():
+            c = colorchooser.askcolor()[1]
+            if c:
+                var.set(c)
+        row = ttk.Frame(root); row.pack(anchor="w")
+        ttk.Button(row, text=item.get("label", "Pick"), command=pick).pack(side="left")
+        ttk.Label(row, textvariable=var).pack(side="left", padx=8)
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_slider(self, root, item):
+        self._acquire(ttk.Label, root, text=item.get("label", ""), wraplength=0).pack(anchor="w")
+        var = tk.DoubleVar(value=item.get("value", 0))
+        ttk.Scale(root, from_=item.get("from", 0), to=item.get("to", 100), variable=var).pack(fill="x")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_progress(self, root, item):
+        var = tk.DoubleVar(value=item.get("value", 0))
+        pb = ttk.Progressbar(root, maximum=item.get("max", 100), variable=var)
+        pb.pack(fill="x")
+        if item.get("var"):
+            self._bind_var(item["var"], var)
+
+    def _render_image(self, root, item):
+        src = item.get("src")
+        if src:
+            try:
+                path = self._resolved_src_cache[src]
+            except KeyError:
+                path = resolve_path(src, self.base_path)
+                if not (path and os.path.exists(path)):
+                    path = None
+                self._resolved_src_cache[src] = path
+            if Image and path:
+                try:
+                    key = _photo_key(path, 600, 400)
+                    tkimg = _cached_photo(key)
+                    if tkimg is not None:
+                        self.images.append(tkimg)
+                        ttk.Label(root, image=tkimg).pack(pady=4)
                     else:
-                        ttk.Label(root, text=f"[Image missing: {item.get('src')}]").pack()
-                else:
-                    ttk.Label(root, text="[Image missing]").pack()
-
+                        # decode in a worker; the label is filled in by _poll_image
+                        lbl = ttk.Label(root, text="[Loading image...]"); lbl.pack(pady=4)
+                        if key not in self._img_futures:
+                            fut = self._img_futures[key] = self._img_pool.submit(_decode_thumbnail, path, 600, 400)
+                            # SimpleQueue.put is thread-safe; the Tk thread drains it
+                            fut.add_done_callback(lambda f, k=key: self._img_done.put((k, f)))
+                        self.after(20, self._poll_image, lbl, key)
+                except Exception:
+                    self._acquire(ttk.Label, root, text="[Image load failed]", wraplength=0).pack()
             else:
-                ttk.Label(root, text=f"[Unsupported widget: {typ}]").pack()
+                self._acquire(ttk.Label, root, text=f"[Image missing: {item.get('src')}]", wraplength=0).pack()
+        else:
+            self._acquire(ttk.Label, root, text="[Image missing]", wraplength=0).pack()
 
-def main():
-    args = sys.argv[1:]
-    path = None; start_scene = None; do_validate = False
-    i = 0
-    while i < len(args):
-        a = args[i]
-        if a == "--open" and i+1 < len(args):
-            path = args[i+1]; i += 2
-        elif a == "--start" and i+1 < len(args):
-            start_scene = args[i+1]; i += 2
-        elif a == "--validate":
-            do_validate = True; i += 1
-        elif a in ("-h","--help"):
-            print("Usage: python ikp_viewer_v0.4.py --open path. Options: --validate, --start SceneName"); return
+    def _drain_images(self):
+        """Store finished decodes in the LRU; Tk thread only."""
+        while True:
+            try:
+                key, fut = self._img_done.get_nowait()
+            except queue.Empty:
+                return
+            if self._img_futures.get(key) is fut:
+                del self._img_futures[key]
+            try:
+                _store_photo(key, ImageTk.PhotoImage(fut.result()))
+            except Exception:
+                pass
+
+    def _poll_image(self, lbl, key):
+        # runs on the Tk thread; only the PIL work happens in the pool
+        self._drain_images()
+        if not lbl.winfo_exists():
+            return  # the scene was re-rendered; the decode is stored by a later drain
+        if key in self._img_futures:
+            self.after(20, self._poll_image, lbl, key)
+            return
+        photo = _cached_photo(key)
+        if photo is None:
+            lbl.configure(text="[Image load failed]")
         else:
-            i += 1
+            self.images.append(photo)
+            lbl.configure(image=photo, text="")
+
+    def destroy(self):
+        # don't leave decode workers behind, or make interpreter exit wait on them
+        self._img_pool.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
+
+    def _render_unsupported(self, root, item):
+        self._acquire(ttk.Label, root, text=f"[Unsupported widget: {item.get('type', '').lower()}]", wraplength=0).pack()
+
+    # widget type -> renderer, looked up once per item
+    _RENDERERS = {
+        "label": _render_label,
+        "input": _render_input,
+        "textarea": _render_textarea,
+        "button": _render_button,
+        "dropdown": _render_dropdown,
+        "checkbox": _render_checkbox,
+        "radiogroup": _render_radiogroup,
+        "colorpicker": _render_colorpicker,
+        "slider": _render_slider,
+        "progress": _render_progress,
+        "image": _render_image,
+    }
+
+def main():
+    p = argparse.ArgumentParser(description="Lightweight runtime for .ikp files")
+    p.add_argument("--open", dest="path", metavar="path", help=".ikp file to open")
+    p.add_argument("--start", dest="start_scene", metavar="SceneName", help="scene to show first")
+    p.add_argument("--validate", action="store_true", help="validate the file and exit")
+    ns, _ = p.parse_known_args()  # unknown options are ignored, as before
+    path, start_scene, do_validate = ns.path, ns.start_scene, ns.validate
 
     if path and do_validate:
         try:
             with open(path, "r", encoding="utf-8") as f:
-                data = load_yaml_text(f.read())
-            errs, warns = validate_ikp(data)
+                errs, warns = validate_ikp_stream(f.read())
             if errs:
                 print("VALIDATION ERRORS:")
                 for e in errs: print("-", e)
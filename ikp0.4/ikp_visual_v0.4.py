@@ -6,11 +6,11 @@ Uses ikp_core for dump/validation/interpolation rules.
 """
 
 import tkinter as tk
-from tkinter import ttk, filedialog, simpledialog, messagebox
+from tkinter import ttk, filedialog, simpledialog, messagebox, font as tkfont
 from tkinter.scrolledtext import ScrolledText
 import os, traceback
 
-from ikp_core import dump_yaml, validate_ikp, load_yaml_text, interpolate
+from ikp_core import dump_yaml, dump_yaml_file, validate_ikp, load_yaml_file, interpolate
 
 try:
     from PIL import Image, ImageTk
@@ -32,6 +32,31 @@ FIELDS = {
     "image":["src", "width", "height"]
 }
 
+# edit_block field name -> (loader(block, field) -> entry text, saver(text) -> value);
+# a None saver leaves the field alone (button actions are rebuilt as a whole)
+def _load_plain(block, f): return str(block.get(f, ""))
+
+def _save_plain(val):
+    if val.lower() in ("true","false"):
+        return val.lower() == "true"
+    return val
+
+def _int_or_str(val): return int(val) if val.isdigit() else val
+
+def _action_loader(key, conv=lambda v: v):
+    def load(block, f):
+        action = block.get("action")
+        return conv(action.get(key, "")) if action else _load_plain(block, f)
+    return load
+
+FIELD_SPECS = {
+    "options": (lambda b, f: ",".join(b.get(f, [])), lambda v: [s.strip() for s in v.split(",") if s.strip()]),
+    **{f: (_load_plain, _int_or_str) for f in ("rows","from","to","max","width","height")},
+    "action_type": (_action_loader("type"), None), "action_target": (_action_loader("target"), None),
+    "action_var": (_action_loader("var"), None), "action_value": (_action_loader("value", str), None),
+}
+_DEFAULT_SPEC = (_load_plain, _save_plain)
+
 class IKPLivePreview(ttk.Frame):
     def __init__(self, parent, ikp_data, active_scene):
         super().__init__(parent)
@@ -72,27 +97,63 @@ class IKPLivePreview(ttk.Frame):
                 ttk.Label(parent, text=f"Error rendering {t}", foreground="red").pack()
 
 class SceneCanvas(tk.Canvas):
-    def __init__(self, parent, app, scene_data):
+    def __init__(self, parent, app, scene_data, block_font):
         super().__init__(parent, bg="#ffffff", highlightthickness=0)
         self.app = app
         self.scene_data = scene_data
+        self.block_font = block_font
         self.dragging_idx = None
         self.ghost = None
+        self.guide = None
+        self._window = None  # (first, last) block indices that have canvas items
+        bar = ttk.Scrollbar(parent, orient="vertical", command=self._scroll); bar.pack(side="right", fill="y")
+        self.configure(yscrollcommand=bar.set, yscrollincrement=45)
+        self.bind("<Configure>", lambda e: self._draw_window())
+        self.bind("<MouseWheel>", lambda e: self._scroll("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.bind("<Button-4>", lambda e: self._scroll("scroll", -1, "units"))
+        self.bind("<Button-5>", lambda e: self._scroll("scroll", 1, "units"))
+        # one binding per event for all blocks; the clicked item's idx_N tag says which
+        self.tag_bind("block", "<Button-1>", lambda e: self.start_drag(e, self._block_at()))
+        self.tag_bind("block", "<Double-Button-1>", lambda e: self.app.edit_block(self._block_at()))
+        self.tag_bind("block", "<Button-3>", lambda e: self.show_context_menu(e, self._block_at()))
         self.render()
 
+    def _block_at(self):
+        for t in self.gettags("current"):
+            if t.startswith("idx_"):
+                return int(t[4:])
+
     def render(self):
-        self.delete("all")
-        y = 10
-        for i, b in enumerate(self.scene_data.get("ui", [])):
+        n = len(self.scene_data.get("ui", []))
+        self.configure(scrollregion=(0, 0, 250, n * 45 + 10))
+        self._window = None
+        self._draw_window()
+
+    def _scroll(self, *args):
+        self.yview(*args)
+        self._draw_window()
+
+    def _draw_window(self):
+        # only blocks in view get canvas items; scrolling draws the others
+        ui = self.scene_data.get("ui", [])
+        height = self.winfo_height()
+        if height <= 1:
+            height = 800  # not mapped yet, <Configure> redraws once it is
+        first = max(0, int(self.canvasy(0)) // 45)
+        last = min(len(ui), first + height // 45 + 2)
+        if (first, last) == self._window:
+            return
+        self._window = (first, last)
+        self.delete("block")
+        y = 10 + first * 45
+        for i in range(first, last):
+            b = ui[i]
             t = b["type"]
             col = BLOCK_COLORS.get(t, "#ddd")
             tag = f"idx_{i}"
             rect = self.create_rectangle(10, y, 240, y+35, fill=col, outline="#333", width=2, tags=("block", tag))
             txt = self.create_text(20, y+17, anchor="w", text=f"{t.upper()}: {b.get('text', b.get('label', ''))[:15]}",
-                                   font=("Arial", 9, "bold"), tags=("block", tag))
-            self.tag_bind(tag, "<Button-1>", lambda e, idx=i: self.start_drag(e, idx))
-            self.tag_bind(tag, "<Double-Button-1>", lambda e, idx=i: self.app.edit_block(idx))
-            self.tag_bind(tag, "<Button-3>", lambda e, idx=i: self.show_context_menu(e, idx))
+                                   font=self.block_font, tags=("block", tag))
             y += 45
 
     def show_context_menu(self, event, idx):
@@ -108,25 +169,29 @@ class SceneCanvas(tk.Canvas):
 
     def start_drag(self, event, idx):
         self.dragging_idx = idx
-        self.ghost = self.create_rectangle(event.x-115, event.y-17, event.x+115, event.y+17,
+        y = self.canvasy(event.y)
+        self.ghost = self.create_rectangle(event.x-115, y-17, event.x+115, y+17,
                                           fill="white", stipple="gray50", outline="blue", dash=(2,2))
+        # moved by do_drag rather than recreated on every motion event
+        self.guide = self.create_line(5, 0, 245, 0, fill="blue", width=3, state="hidden")
 
     def do_drag(self, event):
         if self.dragging_idx is None: return
-        self.coords(self.ghost, event.x-115, event.y-17, event.x+115, event.y+17)
-        self.delete("guide")
-        target_idx = max(0, event.y // 45)
+        y = self.canvasy(event.y)
+        self.coords(self.ghost, event.x-115, y-17, event.x+115, y+17)
+        target_idx = max(0, int(y) // 45)
         guide_y = (target_idx * 45) + 5
-        self.create_line(5, guide_y, 245, guide_y, fill="blue", width=3, tags="guide")
+        self.coords(self.guide, 5, guide_y, 245, guide_y)
+        self.itemconfigure(self.guide, state="normal")
 
     def stop_drag(self, event):
         if self.dragging_idx is not None:
-            target_idx = max(0, event.y // 45)
+            target_idx = max(0, int(self.canvasy(event.y)) // 45)
             item = self.scene_data["ui"].pop(self.dragging_idx)
             target_idx = min(target_idx, len(self.scene_data["ui"]))
             self.scene_data["ui"].insert(target_idx, item)
             self.dragging_idx = None
-            self.delete("guide")
+            self.delete(self.ghost, self.guide)
             self.app.refresh_ui()
 
 class IKPVisualIDE(tk.Tk):
@@ -138,6 +203,13 @@ class IKPVisualIDE(tk.Tk):
         self.active_scene = "Main"
         self.project_title = "Untitled Project"
         self.project_path = None
+        self._canvas = None  # one SceneCanvas, re-pointed at the active scene
+        self._yaml_job = None
+        self._yaml_text = None  # last dump shown in the YAML tab, reused by save_file
+        self._preview_source = None  # (scene, repr of its ui) the live preview shows
+        # named fonts are resolved by Tk once, not re-parsed from a tuple per text item
+        self._block_font = tkfont.Font(self, family="Arial", size=9, weight="bold")
+        self._yaml_font = tkfont.Font(self, family="Courier New", size=10)
 
         self.setup_ui()
         self.refresh_ui()
@@ -165,7 +237,7 @@ class IKPVisualIDE(tk.Tk):
         right = ttk.Frame(self.pane); self.pane.add(right, weight=1)
         self.tabs = ttk.Notebook(right); self.tabs.pack(fill="both", expand=True)
         self.preview_area = ttk.Frame(self.tabs); self.tabs.add(self.preview_area, text="LIVE PREVIEW")
-        self.yaml_area = ScrolledText(self.tabs, width=40, font=("Courier New", 10)); self.tabs.add(self.yaml_area, text="YAML")
+        self.yaml_area = ScrolledText(self.tabs, width=40, font=self._yaml_font); self.tabs.add(self.yaml_area, text="YAML")
 
     def add_block(self, type_name):
         block = {"type": type_name}
@@ -189,27 +261,13 @@ class IKPVisualIDE(tk.Tk):
         for i, f in enumerate(fields):
             ttk.Label(edit_win, text=f).grid(row=i, column=0, padx=10, pady=5)
             e = ttk.Entry(edit_win)
-            if f == "options": e.insert(0, ",".join(block.get(f, [])))
-            elif f.startswith("action") and block.get("action"):
-                if f == "action_type": e.insert(0, block.get("action", {}).get("type", ""))
-                elif f == "action_target": e.insert(0, block.get("action", {}).get("target", ""))
-                elif f == "action_var": e.insert(0, block.get("action", {}).get("var", ""))
-                elif f == "action_value": e.insert(0, str(block.get("action", {}).get("value", "")))
-            else:
-                e.insert(0, str(block.get(f, "")))
+            e.insert(0, FIELD_SPECS.get(f, _DEFAULT_SPEC)[0](block, f))
             e.grid(row=i, column=1, padx=10, pady=5); entries[f] = e
 
         def save():
             for f, e in entries.items():
-                val = e.get()
-                if f == "options": block[f] = [s.strip() for s in val.split(",") if s.strip()]
-                elif f in ("rows","from","to","max","width","height"): block[f] = int(val) if val.isdigit() else val
-                elif f.startswith("action"): pass
-                else:
-                    if val.lower() in ("true","false"):
-                        block[f] = val.lower() == "true"
-                    else:
-                        block[f] = val
+                saver = FIELD_SPECS.get(f, _DEFAULT_SPEC)[1]
+                if saver: block[f] = saver(e.get())
             if block["type"] == "button":
                 typ = entries.get("action_type").get()
                 if typ:
@@ -227,18 +285,34 @@ class IKPVisualIDE(tk.Tk):
         ttk.Button(edit_win, text="Save Changes", command=save).grid(row=len(fields), columnspan=2, pady=10)
 
     def refresh_ui(self):
-        for w in self.canvas_container.winfo_children(): w.destroy()
-        canvas = SceneCanvas(self.canvas_container, self, self.model["scenes"][self.active_scene]); canvas.pack(fill="both", expand=True)
-        canvas.bind("<B1-Motion>", canvas.do_drag); canvas.bind("<ButtonRelease-1>", canvas.stop_drag)
+        scene = self.model["scenes"][self.active_scene]
+        canvas = self._canvas
+        if canvas is None:
+            canvas = self._canvas = SceneCanvas(self.canvas_container, self, scene, self._block_font); canvas.pack(fill="both", expand=True)
+            canvas.bind("<B1-Motion>", canvas.do_drag); canvas.bind("<ButtonRelease-1>", canvas.stop_drag)
+        else:
+            canvas.scene_data = scene; canvas.render()
+
+        # a refresh that leaves the active ui unchanged (drop in place, no-op edit) keeps the preview
+        source = (self.active_scene, repr(scene.get("ui", [])))
+        if source != self._preview_source:
+            for w in self.preview_area.winfo_children(): w.destroy()
+            IKPLivePreview(self.preview_area, self.model, self.active_scene).pack(fill="both", expand=True, padx=20, pady=20)
+            self._preview_source = source
+
+        # coalesce bursts of edits/drags into a single dump
+        if self._yaml_job:
+            self.after_cancel(self._yaml_job)
+        self._yaml_job = self.after(150, self._refresh_yaml)
 
-        for w in self.preview_area.winfo_children(): w.destroy()
-        IKPLivePreview(self.preview_area, self.model, self.active_scene).pack(fill="both", expand=True, padx=20, pady=20)
+        self.scene_sel["values"] = list(self.model["scenes"].keys()); self.scene_sel.set(self.active_scene)
 
+    def _refresh_yaml(self):
+        self._yaml_job = None
         self.yaml_area.delete("1.0", "end")
         out = {"ikp":"0.4", "meta":{"title":self.project_title}, **self.model}
-        self.yaml_area.insert("1.0", dump_yaml(out))
-
-        self.scene_sel["values"] = list(self.model["scenes"].keys()); self.scene_sel.set(self.active_scene)
+        self._yaml_text = dump_yaml(out)
+        self.yaml_area.insert("1.0", self._yaml_text)
 
     def on_scene_change(self, e):
         self.active_scene = self.scene_sel.get(); self.refresh_ui()
@@ -253,10 +327,13 @@ class IKPVisualIDE(tk.Tk):
     def save_file(self):
         path = filedialog.asksaveasfilename(defaultextension=".ikp")
         if not path: return
+        # the YAML tab already holds this dump; only a pending refresh makes it stale
+        if self._yaml_job:
+            self.after_cancel(self._yaml_job)
+            self._refresh_yaml()
         try:
-            out = {"ikp":"0.4","meta":{"title":self.project_title}, **self.model}
             with open(path, "w", encoding="utf-8") as f:
-                f.write(dump_yaml(out))
+                f.write(self._yaml_text)
             self.project_path = os.path.dirname(path)
             messagebox.showinfo("Saved", f"Saved {path}")
         except Exception as e:
@@ -266,8 +343,7 @@ class IKPVisualIDE(tk.Tk):
         path = filedialog.askopenfilename(filetypes=[("IKP Files","*.ikp"), ("YAML","*.yaml;*.yml"), ("All Files","*.*")])
         if not path: return
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = load_yaml_text(f.read())
+            data = load_yaml_file(path)
         except Exception as e:
             messagebox.showerror("Open Error", str(e)); return
         if not isinstance(data, dict) or "scenes" not in data:
@@ -310,8 +386,7 @@ class IKPVisualIDE(tk.Tk):
         try:
             for name, data in examples.items():
                 p = os.path.join(exdir, name)
-                with open(p, "w", encoding="utf-8") as f:
-                    f.write(dump_yaml(data))
+                dump_yaml_file(data, p)
             messagebox.showinfo("Exported", f"Examples exported to {exdir}")
         except Exception as e:
             messagebox.showerror("Export Error", str(e))